@@ -0,0 +1,70 @@
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Run from the repository root: python benchmarks/cold_start.py
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+PAGES = ['Home.py', 'pages/Histroic_Values.py', 'pages/Heat_Map.py']
+HEAVY_MODULES = ['geopandas', 'shapely', 'pydeck']
+RUNS = 3
+
+
+# eager: the old up-front imports and geometry load; lazy: a real run, with the background warm-up the page starts
+# competing with its render; no-warmup: lazy with the warm-up turned off, the page's own cost alone
+MODES = ['eager', 'lazy', 'no-warmup']
+
+
+def measure(mode, page):
+    # Runs in a fresh interpreter so nothing is imported or cached ahead of the page
+    from streamlit.testing.v1 import AppTest
+    import sfr.warmup
+
+    if mode == 'no-warmup':
+        sfr.warmup.warm_up = lambda status: status.finish()
+
+    start = time.perf_counter()
+
+    if mode == 'eager':
+        # What every page paid before: geopandas and pydeck imported at the top and the state's geometries loaded on each rerun
+        import geopandas
+        import pydeck
+        from sfr.data import load_data
+        from sfr.geometry import load_geometries
+
+        load_geometries(load_data().meta['State'].iloc[0])
+
+    import_seconds = time.perf_counter() - start
+    app = AppTest.from_file(str(ROOT / page), default_timeout=120).run()
+    render_seconds = time.perf_counter() - start
+
+    loaded = ','.join(module for module in HEAVY_MODULES if module in sys.modules) or '-'
+    error = ' (page raised an exception)' if len(app.exception) > 0 else ''
+
+    # The page started the warm-up; it shares this process's resource cache, so wait for it to report its time
+    status = sfr.warmup.start_warmup()
+    while not status.ready:
+        time.sleep(0.01)
+
+    warmup_seconds = time.perf_counter() - start if mode == 'lazy' else float('nan')
+    print(f'{import_seconds:.4f} {render_seconds:.4f} {warmup_seconds:.4f} {loaded}{error}')
+
+
+if len(sys.argv) == 3:
+    measure(sys.argv[1], sys.argv[2])
+    sys.exit()
+
+print(f"{'Page':<26} {'Mode':<10} {'Import s':>9} {'First render s':>15} {'Warm s':>7}  Heavy modules loaded at render")
+for page in PAGES:
+    for mode in MODES:
+        results = []
+        for _ in range(RUNS):
+            output = subprocess.run([sys.executable, __file__, mode, page], capture_output=True, text=True, check=True, cwd=ROOT).stdout
+            import_seconds, render_seconds, warmup_seconds, loaded = output.split(maxsplit=3)
+            results.append((float(render_seconds), float(import_seconds), float(warmup_seconds), loaded))
+
+        render_seconds, import_seconds, warmup_seconds, loaded = sorted(results)[RUNS // 2]
+        warmup = '-' if warmup_seconds != warmup_seconds else f'{warmup_seconds:.3f}'
+        print(f'{page:<26} {mode:<10} {import_seconds:>9.3f} {render_seconds:>15.3f} {warmup:>7}  {loaded.strip()}')
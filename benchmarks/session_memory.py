@@ -0,0 +1,46 @@
+import pickle
+import sys
+from pathlib import Path
+
+# Run from the repository root: python benchmarks/session_memory.py
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sfr.data import load_data
+
+SESSIONS = [1, 2, 4, 8, 16]
+
+
+def rss_mb():
+    with open('/proc/self/status') as file:
+        for line in file:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+
+
+def simulate(get_frame):
+    sessions = []
+    results = []
+
+    for count in SESSIONS:
+        while len(sessions) < count:
+            sessions.append({'df': get_frame()})
+        results.append((count, rss_mb()))
+
+    sessions = None
+    return results
+
+
+# Shared frame (st.cache_resource): every session holds a reference to the same object
+baseline = rss_mb()
+shared = simulate(load_data)
+
+# Copied frame (st.cache_data): every session gets its own unpickled copy of the metadata and values it used to
+# load; the memory-mapped metric and region sidecars were never part of that copy
+data = load_data()
+data = pickle.dumps((data.meta, data.values))
+copied = simulate(lambda: pickle.loads(data))
+
+print(f'Baseline RSS: {baseline:,.0f} MB')
+print(f"{'Sessions':>8} {'Shared MB':>12} {'Copied MB':>12}")
+for (count, shared_mb), (_, copied_mb) in zip(shared, copied):
+    print(f'{count:>8} {shared_mb:>12,.0f} {copied_mb:>12,.0f}')
@@ -0,0 +1,87 @@
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Run from the repository root: python benchmarks/storage_layout.py
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import pandas as pd
+from sfr.data import manifest_artifact, read_dataset, sidecar_dir, values_file
+
+RUNS = 5
+
+
+def rss_mb():
+    with open('/proc/self/status') as file:
+        for line in file:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+
+
+def measure(layout, path):
+    # Runs in a fresh interpreter so resident memory is not shared between layouts
+    if layout == 'legacy':
+        read = pd.read_feather
+    elif layout == 'columnar':
+        # As a server loads it: the value matrix is memory-mapped from the artifact's sidecar
+        read = lambda path: read_dataset(path, manifest_artifact()[1])
+    else:
+        # Without a matching sidecar, the month columns are decompressed and copied out of the artifact
+        read = read_dataset
+
+    before = rss_mb()
+    data = read(path)
+    after = rss_mb()
+
+    if layout == 'legacy':
+        frame_bytes = data.memory_usage(deep=True).sum()
+    else:
+        frame_bytes = data.meta.memory_usage(deep=True).sum() + data.values.nbytes
+
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        read(path)
+        times.append(time.perf_counter() - start)
+
+    print(f'{after - before:.1f} {sorted(times)[RUNS // 2]:.4f} {frame_bytes / 2**20:.1f}')
+
+
+def write_legacy(path):
+    # Object-dtype geography, float64 values and a string ZIP index, as prepare.py used to write them
+    df = read_dataset(manifest_artifact()[0]).frame()
+    df[['State', 'City', 'Metro', 'County']] = df[['State', 'City', 'Metro', 'County']].astype(object)
+    df = df.astype({date: 'float64' for date in df.columns[4:]})
+    df.to_feather(path)
+
+
+if len(sys.argv) == 3:
+    measure(sys.argv[1], sys.argv[2])
+    sys.exit()
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    legacy_file = Path(tmp_dir) / 'zhvi_legacy.feather'
+    write_legacy(legacy_file)
+
+    results = {}
+    for layout, path in [('legacy', legacy_file), ('columnar', manifest_artifact()[0]), ('arrow', manifest_artifact()[0])]:
+        output = subprocess.run([sys.executable, __file__, layout, str(path)], capture_output=True, text=True, check=True).stdout
+        rss, seconds, frame_mb = output.split()
+
+        # The columnar layout is served with its value matrix sidecar, so both count towards its disk use
+        file_bytes = Path(path).stat().st_size
+        if layout == 'columnar':
+            file_bytes += values_file(sidecar_dir(path)).stat().st_size
+
+        results[layout] = (file_bytes / 2**20, float(seconds), float(rss), float(frame_mb))
+
+print(f"{'Layout':<10} {'File MB':>9} {'Load s':>9} {'RSS MB':>9} {'Frame MB':>9}")
+for layout, (file_mb, seconds, rss, frame_mb) in results.items():
+    print(f'{layout:<10} {file_mb:>9.1f} {seconds:>9.4f} {rss:>9.1f} {frame_mb:>9.1f}')
+
+legacy = results['legacy']
+for layout in ['columnar', 'arrow']:
+    saved = [1 - new / old for new, old in zip(results[layout], legacy)]
+    print(f"{'Saved':<10} {saved[0]:>9.0%} {saved[1]:>9.0%} {saved[2]:>9.0%} {saved[3]:>9.0%}  ({layout})")
@@ -1,38 +1,357 @@
-import pgeocode
+import argparse
+import json
+import os
+import shutil
+import sys
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
 from pathlib import Path
 
-# Get Source Data Path
-with open('data_prep\source_path.txt') as file:
-    DATA_FILE = Path(file.readline())
+# Run from the repository root: python data_prep/prepare.py
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
-# Read Source Data
-raw_df = pd.read_csv(DATA_FILE, dtype={'RegionName':'str'})
-raw_df = raw_df.rename(columns={'RegionName':'ZIP', 'CountyName':'County'}).drop(columns=['RegionID', 'SizeRank', 'RegionType','StateName'])
+from sfr.data import DATA_DIR, MANIFEST_FILE, artifact_file, file_sha256, manifest_artifact, metrics_file, rollup_dir, sidecar_dir, tile_dir, values_file, write_value_matrix
+from sfr.metrics import write_metric_cube
+from sfr.rollups import write_rollups
+from sfr.tiles import write_tiles
 
-# Add Lat/Long
-nomi = pgeocode.Nominatim('us')
-raw_df['City_Nomi'] = nomi.query_postal_code(raw_df['ZIP'].tolist()).place_name
+SOURCE_PATH_FILE = Path('data_prep/source_path.txt')
+TEMP_FILE = DATA_DIR / 'zhvi.feather.tmp'
+GEOMETRY_DIR = Path('geometries')
+PLACE_CACHE_FILE = Path('data_prep/zip_places.csv')
 
-# Clean City column
-raw_df.loc[raw_df['City'].notna(), 'City_Calc'] = raw_df['City']
-raw_df.loc[raw_df['City'].isna(), 'City_Calc'] = raw_df['City_Nomi']
-raw_df['City'] = raw_df['City_Calc']
-raw_df = raw_df.drop(columns=['City_Calc', 'City_Nomi'])
+GEO_COLS = ['State', 'City', 'Metro', 'County']
+SOURCE_GEO_COLS = ['RegionName', 'State', 'City', 'Metro', 'CountyName']
+DROP_COLS = ['RegionID', 'SizeRank', 'RegionType', 'StateName']
 
-# Use ZIP as index
-raw_df.index = raw_df['ZIP']
-raw_df = raw_df.drop(columns='ZIP')
+# Rows per chunk in streaming mode
+CHUNK_ROWS = 2000
 
-# Interpolate Gap Months
-date_df = raw_df.iloc[:,4:].interpolate(axis=1)
-raw_df = raw_df.iloc[:, :4].merge(date_df, 'left', left_index=True, right_index=True)
 
-# Round Values to Nearest Dollar
-raw_df.iloc[:, 4:] = raw_df.iloc[:, 4:].round(0)
+def read_source_path():
+    with open(SOURCE_PATH_FILE) as file:
+        return Path(file.readline())
 
-# Mark Unrecognized Metroplexes
-raw_df.loc[:, 'Metro'] = raw_df.loc[:, 'Metro'].fillna('Unrecognized Metroplex')
 
-# Serialize Data
-raw_df.to_feather('zhvi-sfr-zip\zhvi.feather')
\ No newline at end of file
+def read_dates(data_file):
+    header = pd.read_csv(data_file, nrows=0).columns
+    return [col for col in header if col not in SOURCE_GEO_COLS + DROP_COLS]
+
+
+def read_geography(data_file):
+    # Geography columns only, one row per ZIP, so this stays small however many months the source has
+    geo_df = pd.read_csv(data_file, usecols=SOURCE_GEO_COLS, dtype='str')
+    geo_df = geo_df.rename(columns={'RegionName':'ZIP', 'CountyName':'County'})
+    return clean_geography(geo_df)
+
+
+def version_metadata(dates):
+    # The artifact is versioned by its latest month
+    return {b'version': dates[-1].encode()}
+
+
+def publish_artifact(version):
+    # Every build is published under its own name with its own sidecar directory, and the manifest is switched
+    # last, so a server never sees a half-published build; a failed run leaves the previous one live
+    checksum = file_sha256(TEMP_FILE)
+    data_file = artifact_file(version, checksum, DATA_DIR)
+    previous_file = manifest_artifact(MANIFEST_FILE)[0]
+    os.replace(TEMP_FILE, data_file)
+
+    # An identical rebuild already has complete sidecars; new ones are built aside and renamed into place
+    sidecars = sidecar_dir(data_file)
+
+    if not sidecars.exists():
+        staging = sidecars.with_name(sidecars.name + '.tmp')
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir()
+
+        write_value_matrix(data_file, values_file(staging), checksum)
+        write_metric_cube(data_file, metrics_file(staging), checksum)
+        write_rollups(data_file, rollup_dir(staging), checksum)
+        write_tiles(data_file, tile_dir(staging), checksum, GEOMETRY_DIR)
+
+        os.replace(staging, sidecars)
+
+    manifest_temp = MANIFEST_FILE.with_name(MANIFEST_FILE.name + '.tmp')
+    with open(manifest_temp, 'w') as file:
+        json.dump({'version': version, 'file': data_file.name, 'sha256': checksum}, file, indent=2)
+
+    os.replace(manifest_temp, MANIFEST_FILE)
+    prune_artifacts([data_file, previous_file])
+
+
+def prune_artifacts(keep):
+    # Servers hold on to the build before the current one until their sessions move on, so the last two are kept
+    for data_file in DATA_DIR.glob('zhvi-*.feather'):
+        if data_file not in keep:
+            data_file.unlink()
+            shutil.rmtree(sidecar_dir(data_file), ignore_errors=True)
+
+
+def write_artifact(table):
+    feather.write_feather(table, TEMP_FILE)
+    publish_artifact(table.schema.metadata[b'version'].decode())
+
+
+def resolve_places(zip_codes):
+    # ZIP -> place name lookups persist between runs; pgeocode is only queried, in one batch, for ZIPs never seen before
+    if PLACE_CACHE_FILE.exists():
+        places = pd.read_csv(PLACE_CACHE_FILE, dtype='str', index_col='ZIP')['Place']
+    else:
+        places = pd.Series(dtype='str', index=pd.Index([], dtype='str', name='ZIP'), name='Place')
+
+    unseen = pd.Index(zip_codes).unique().difference(places.index)
+
+    if len(unseen) > 0:
+        import pgeocode
+
+        found = pgeocode.Nominatim('us').query_postal_code(unseen.tolist()).place_name
+        # ZIPs pgeocode cannot place are cached too, so they are not queried again
+        places = pd.concat([places, pd.Series(found.to_numpy(), index=unseen.rename('ZIP'), name='Place')])
+        places.to_frame().to_csv(PLACE_CACHE_FILE)
+
+    return places.reindex(zip_codes).to_numpy()
+
+
+def clean_geography(raw_df):
+    # Fill Missing Cities with the ZIP's Place Name
+    missing_city = raw_df['City'].isna()
+
+    if missing_city.any():
+        raw_df.loc[missing_city, 'City'] = resolve_places(raw_df.loc[missing_city, 'ZIP'])
+
+    # Mark Unrecognized Metroplexes
+    raw_df.loc[:, 'Metro'] = raw_df.loc[:, 'Metro'].fillna('Unrecognized Metroplex')
+
+    return raw_df
+
+
+def interpolate_rows(values):
+    # In-place equivalent of DataFrame.interpolate(axis=1): interior gaps are filled linearly,
+    # trailing gaps repeat the last value and leading gaps stay empty
+    missing = np.isnan(values)
+
+    if not missing.any():
+        return values
+
+    n_cols = values.shape[1]
+    cols = np.arange(n_cols)
+
+    prev_idx = np.maximum.accumulate(np.where(missing, -1, cols), axis=1)
+    next_idx = np.minimum.accumulate(np.where(missing, n_cols, cols)[:, ::-1], axis=1)[:, ::-1]
+
+    rows, gap_cols = np.nonzero(missing)
+    prev_cols = prev_idx[rows, gap_cols]
+    next_cols = next_idx[rows, gap_cols]
+
+    filled = prev_cols >= 0
+    rows, gap_cols, prev_cols, next_cols = rows[filled], gap_cols[filled], prev_cols[filled], next_cols[filled]
+
+    fill_vals = values[rows, prev_cols]
+    interior = next_cols < n_cols
+    step = (values[rows[interior], next_cols[interior]] - fill_vals[interior]) / (next_cols[interior] - prev_cols[interior])
+    fill_vals[interior] += step * (gap_cols[interior] - prev_cols[interior])
+
+    values[rows, gap_cols] = fill_vals
+    return values
+
+
+def prepare_full(data_file):
+    # Read Source Data
+    raw_df = pd.read_csv(data_file, dtype={'RegionName':'str'})
+    raw_df = raw_df.rename(columns={'RegionName':'ZIP', 'CountyName':'County'}).drop(columns=DROP_COLS)
+    raw_df = clean_geography(raw_df)
+
+    # Use ZIP as index
+    raw_df.index = raw_df['ZIP']
+    raw_df = raw_df.drop(columns='ZIP')
+
+    # Interpolate Gap Months
+    date_df = raw_df.iloc[:,4:].interpolate(axis=1)
+    raw_df = raw_df.iloc[:, :4].merge(date_df, 'left', left_index=True, right_index=True)
+
+    # Round Values to Nearest Dollar
+    raw_df.iloc[:, 4:] = raw_df.iloc[:, 4:].round(0)
+
+    # Dictionary Encode Geography Columns
+    raw_df[GEO_COLS] = raw_df[GEO_COLS].astype('category')
+
+    # Store ZIPs as Fixed-Width Codes and Rounded Values as 32-bit Floats (exact for whole dollars below $16.7M)
+    zip_df = pd.DataFrame({'ZIP': pd.to_numeric(raw_df.index).astype('uint32')})
+    date_df = pd.DataFrame(raw_df.iloc[:, 4:].to_numpy('float32'), columns=raw_df.columns[4:])
+    raw_df = pd.concat([zip_df, raw_df.iloc[:, :4].reset_index(drop=True), date_df], axis=1)
+
+    # Serialize Data
+    table = pa.Table.from_pandas(raw_df, preserve_index=False)
+    write_artifact(table.replace_schema_metadata({**table.schema.metadata, **version_metadata(date_df.columns)}))
+
+
+def prepare_streaming(data_file, chunk_rows=CHUNK_ROWS):
+    # First pass reads only the geography columns, so every chunk can share one dictionary per column
+    geo_df = read_geography(data_file)
+
+    zip_codes = pa.array(pd.to_numeric(geo_df['ZIP']).to_numpy('uint32'))
+    geo_cats = {col: pd.Categorical(geo_df[col]) for col in GEO_COLS}
+    geo_dicts = {col: pa.array(cats.categories.to_numpy(dtype=str)) for col, cats in geo_cats.items()}
+    geo_df = None
+
+    dates = read_dates(data_file)
+
+    schema = pa.schema(
+        [('ZIP', pa.uint32())]
+        + [(col, pa.dictionary(pa.int32(), pa.string())) for col in GEO_COLS]
+        + [(date, pa.float32()) for date in dates],
+        metadata=version_metadata(dates),
+    )
+
+    # Second pass streams the monthly values in row chunks and appends each one as an Arrow record batch
+    chunks = pd.read_csv(data_file, usecols=dates, dtype={date: 'float64' for date in dates}, chunksize=chunk_rows)
+    start = 0
+
+    with pa.OSFile(str(TEMP_FILE), 'wb') as sink, pa.ipc.new_file(sink, schema, options=pa.ipc.IpcWriteOptions(compression='lz4')) as writer:
+        for chunk in chunks:
+            stop = start + len(chunk)
+
+            # Interpolate Gap Months and Round Values to Nearest Dollar, in place
+            values = chunk[dates].to_numpy(dtype='float64')
+            interpolate_rows(values)
+            np.round(values, out=values)
+            values = values.astype('float32')
+            chunk = None
+
+            columns = [zip_codes[start:stop]]
+            for col in GEO_COLS:
+                codes = geo_cats[col].codes[start:stop].astype('int32')
+                columns.append(pa.DictionaryArray.from_arrays(pa.array(codes, mask=codes < 0), geo_dicts[col]))
+
+            columns += [pa.array(values[:, pos]) for pos in range(len(dates))]
+            writer.write_batch(pa.record_batch(columns, schema=schema))
+            start = stop
+
+    publish_artifact(dates[-1])
+
+
+def prepare_incremental(data_file, chunk_rows=CHUNK_ROWS):
+    # Assumes published history is unchanged: the source is streamed once, and only the months from each ZIP's last
+    # report on are recomputed, from the source's unrounded values, so the result matches a full rebuild
+    table = feather.read_table(manifest_artifact(MANIFEST_FILE)[0])
+    old_dates = [name for name in table.column_names if name not in GEO_COLS and name != 'ZIP']
+    dates = read_dates(data_file)
+
+    if dates[:len(old_dates)] != old_dates:
+        raise ValueError('Source months do not extend the existing artifact; run a full rebuild instead')
+
+    new_dates = dates[len(old_dates):]
+    old_zips = pd.Index(table.column('ZIP').to_numpy())
+    n_old = len(old_dates)
+
+    # Geography is always taken from the source, since Zillow renames and reassigns metros, counties and cities;
+    # the place cache keeps pgeocode to ZIPs it has never seen
+    geo_df = read_geography(data_file)
+    n_new_zips = (old_zips.get_indexer(pd.to_numeric(geo_df['ZIP']).to_numpy('uint32')) < 0).sum()
+
+    # Source row of each existing ZIP (-1 when the source no longer has it), its last reported month and the
+    # unrounded value it reported then
+    source_rows = np.full(len(old_zips), -1)
+    last_valid = np.full(len(old_zips), -1)
+    anchors = np.full(len(old_zips), np.nan)
+    new_months = np.full((len(old_zips), len(new_dates)), np.nan)
+    new_zip_rows = []
+    new_zip_values = []
+
+    chunks = pd.read_csv(data_file, usecols=['RegionName'] + dates, dtype={'RegionName':'str', **{date: 'float64' for date in dates}}, chunksize=chunk_rows)
+    offset = 0
+
+    for chunk in chunks:
+        rows = old_zips.get_indexer(pd.to_numeric(chunk['RegionName']).to_numpy('uint32'))
+        known = rows >= 0
+
+        old_values = chunk[old_dates].to_numpy()[known]
+        reported = ~np.isnan(old_values)
+        chunk_last = np.where(reported.any(axis=1), n_old - 1 - np.argmax(reported[:, ::-1], axis=1), -1)
+
+        source_rows[rows[known]] = offset + np.flatnonzero(known)
+        last_valid[rows[known]] = chunk_last
+        anchors[rows[known]] = old_values[np.arange(len(chunk_last)), chunk_last]
+        new_months[rows[known]] = chunk[new_dates].to_numpy()[known]
+
+        if not known.all():
+            values = chunk[dates].to_numpy()[~known]
+            interpolate_rows(values)
+            new_zip_rows.append(offset + np.flatnonzero(~known))
+            new_zip_values.append(np.round(values))
+
+        offset += len(chunk)
+        chunk = None
+
+    # ZIPs the source dropped are dropped here too, as a full rebuild would
+    kept = source_rows >= 0
+
+    # Same months, ZIPs and row order, and geography unchanged
+    if len(new_dates) == 0 and np.array_equal(source_rows, np.arange(len(geo_df))):
+        if all(table.column(col).to_pandas().astype(object).equals(geo_df[col].astype(object)) for col in GEO_COLS):
+            print(f"Artifact is already up to date ({old_dates[-1]})")
+            return
+
+    # Only ZIPs with a trailing gap that a new month now closes change their old months, from their last report on;
+    # every new month is interpolated from the last old month on
+    changed = kept & (last_valid >= 0) & (last_valid < n_old - 1) & ~np.isnan(new_months).all(axis=1)
+    start = min([n_old - 1 if len(new_dates) > 0 else n_old] + last_valid[changed].tolist())
+
+    window = np.empty((len(old_zips), len(dates) - start))
+    for pos, date in enumerate(old_dates[start:]):
+        window[:, pos] = table.column(date).to_numpy()
+
+    # From its last report on, a ZIP's months are refilled from the unrounded value reported then, not the rounded
+    # artifact value
+    refill = kept & (last_valid >= start)
+    window[:, :n_old - start][refill[:, None] & (np.arange(start, n_old) > last_valid[:, None])] = np.nan
+    window[refill, last_valid[refill] - start] = anchors[refill]
+    window[:, n_old - start:] = new_months
+    interpolate_rows(window)
+    np.round(window, out=window)
+
+    if len(new_zip_values) > 0:
+        new_zip_rows = np.concatenate(new_zip_rows)
+        new_zip_values = np.concatenate(new_zip_values).astype('float32')
+    else:
+        new_zip_rows = np.empty(0, dtype=int)
+        new_zip_values = np.empty((0, len(dates)), dtype='float32')
+
+    # Rows follow the source, existing and new ZIPs alike, like a full rebuild, so they line up with its geography
+    order = np.argsort(np.concatenate([source_rows[kept], new_zip_rows]), kind='stable')
+    columns = {'ZIP': pa.array(pd.to_numeric(geo_df['ZIP']).to_numpy('uint32'))}
+
+    for col in GEO_COLS:
+        columns[col] = pa.array(geo_df[col].astype(object).astype('category'))
+
+    for pos, date in enumerate(dates):
+        if pos < start:
+            old_values = table.column(date).to_numpy()[kept]
+        else:
+            old_values = window[kept, pos - start].astype('float32')
+
+        columns[date] = pa.array(np.concatenate([old_values, new_zip_values[:, pos]])[order])
+
+    table = None
+    write_artifact(pa.table(columns).replace_schema_metadata(version_metadata(dates)))
+    print(f"Added {len(new_dates)} months and {n_new_zips} ZIPs, dropped {(~kept).sum()} ZIPs, rewrote {len(dates) - start} trailing months")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prepare the ZHVI SFR by ZIP artifact from the Zillow source CSV.')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--stream', action='store_true', help='read the CSV in row chunks and write Arrow record batches incrementally')
+    mode.add_argument('--update', action='store_true', help='append new months and ZIPs to the existing artifact instead of rebuilding it')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='rows per chunk in streaming and update modes')
+    args = parser.parse_args()
+
+    if args.stream:
+        prepare_streaming(read_source_path(), args.chunk_rows)
+    elif args.update:
+        prepare_incremental(read_source_path(), args.chunk_rows)
+    else:
+        prepare_full(read_source_path())
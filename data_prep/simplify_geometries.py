@@ -0,0 +1,29 @@
+import geopandas as gpd
+import shapely
+from pathlib import Path
+
+GEOMETRY_DIR = Path('geometries')
+OUTPUT_DIR = GEOMETRY_DIR / 'simplified'
+
+# Simplification tolerance (degrees) per level; level 0 is the full-resolution source file
+LEVEL_TOLERANCES = {1: 0.0005, 2: 0.002, 3: 0.008}
+
+# Only the columns the heat map reads are kept
+KEEP_COLS = ['ZCTA5CE10', 'INTPTLAT10', 'INTPTLON10', 'geometry']
+
+OUTPUT_DIR.mkdir(exist_ok=True)
+
+for file in sorted(GEOMETRY_DIR.glob('*.feather')):
+    zip_geos = gpd.read_feather(file)[KEEP_COLS]
+    full_size = len(zip_geos.to_json())
+    sizes = []
+
+    for level, tolerance in LEVEL_TOLERANCES.items():
+        simple_geos = zip_geos.copy()
+        # ZIPs are simplified as one coverage, so edges shared by neighbouring ZIPs stay shared with no gaps or overlaps
+        simple_geos['geometry'] = shapely.coverage_simplify(zip_geos.geometry.values, tolerance)
+        simple_geos.to_feather(OUTPUT_DIR / f'{file.stem}_l{level}.feather')
+        sizes.append(f'l{level} {len(simple_geos.to_json()) / full_size:.0%}')
+
+    # GeoJSON payload of each level relative to the full-resolution polygons
+    print(f"{file.name}: {full_size / 2**20:.1f} MB GeoJSON, {', '.join(sizes)}")
@@ -1,213 +1,26 @@
 import pandas as pd
-import geopandas as gpd
 import streamlit as st
-from pathlib import Path
-from os import listdir
-
-DATA_FILE = Path('zhvi-sfr-zip/zhvi.feather')
-GEOMETRY_DIR = Path('geometries')
+from sfr.cache import LRUCache
+from sfr.filters import init_filter_state, filter_expander
+from sfr.series import AGGREGATE_ZIP_COUNT, BAND_NAMES, POINT_BUDGET, aggregate_periods, band_values, downsample_positions
+from sfr.tables import DEFAULT_TABLE_MONTHS, descending_order, table_pager
 
 st.set_page_config(page_title="Avg SFR Historic Values", layout='wide', page_icon=':house:', initial_sidebar_state='collapsed')
 
-if 'zip_state' not in st.session_state:
-    st.session_state['zip_state'] = 'Alaska'
-
-if 'default_state' not in st.session_state:
-    st.session_state['default_state'] = 0
-
-if 'default_metro' not in st.session_state:
-    st.session_state['default_metro'] = 0
-
-if 'default_counties' not in st.session_state:
-    st.session_state['default_counties'] = ['Anchorage Borough']
-
-if 'default_cities' not in st.session_state:
-    st.session_state['default_cities'] = []
-
-if 'default_zips' not in st.session_state:
-    st.session_state['default_zips'] = ['99501']
+init_filter_state()
 
 if 'default_timeframe' not in st.session_state:
     st.session_state['default_timeframe'] = 0
 
+if 'default_resolution' not in st.session_state:
+    st.session_state['default_resolution'] = 0
+
 if 'chrt_dtbl_view' not in st.session_state:
     st.session_state['chrt_dtbl_view'] = False
 
-if 'zip_toggle_pos' not in st.session_state:
-    st.session_state['zip_toggle_pos'] = False
-
-
-@st.cache_data(show_spinner='Loading Avg SFR Value Data...', ttl='12h')
-def load_data():
-    return pd.read_feather(DATA_FILE)
-
-
-def update_state():
-    df = st.session_state['df']
-    chosen_state = st.session_state['chosen_state']
-    
-    state_dict = {
-        'AK':'Alaska', 'AL':'Alabama', 'AR':'Arkansas', 'AZ':'Arizona', 'CA':'California',
-        'CO':'Colorado', 'CT':'Connecticut', 'DC':'District of Columbia', 'DE':'Delaware',
-        'FL':'Florida', 'GA':'Georgia', 'HI':'Hawaii', 'IA':'Iowa', 'ID':'Idaho',
-        'IL':'Illinois', 'IN':'Indiana', 'KS':'Kansas', 'KY':'Kentucky', 'LA':'Louisiana',
-        'MA':'Massachusetts', 'MD':'Maryland', 'ME':'Maine', 'MI':'Michigan', 'MN':'Minnesota',
-        'MO':'Missouri', 'MS':'Mississippi', 'MT':'Montana', 'NC':'North Carolina',
-        'ND':'North Dakota', 'NE':'Nebraska', 'NH':'New Hampshire','NJ':'New Jersey',
-        'NM':'New Mexico', 'NV':'Nevada', 'NY':'New York', 'OH':'Ohio', 'OK':'Oklahoma',
-        'OR':'Oregon', 'PA':'Pennsylvania', 'RI':'Rhode Island', 'SC':'South Carolina',
-        'SD':'South Dakota', 'TN':'Tennessee', 'TX':'Texas', 'UT':'Utah', 'VA':'Virginia',
-        'VT':'Vermont', 'WA':'Washington', 'WI':'Wisconsin', 'WV':'West Virginia', 'WY':'Wyoming'
-    }
-    
-    df = df.loc[df['State'] == chosen_state]
-    metro_opts = sorted(df['Metro'].unique())
-    
-    # Make "Unrecognized Metroplex" the last option
-    if 'Unrecognized Metroplex' in metro_opts:
-        metro_opts.remove('Unrecognized Metroplex')
-        metro_opts.append('Unrecognized Metroplex')
-
-    df = df.loc[df['Metro'] == metro_opts[0]]
-    counties = sorted(df['County'].unique())
-
-    df = df.loc[df['County'] == counties[0]]
-
-    st.session_state['zip_state'] = state_dict[chosen_state]
-    st.session_state['default_state'] = list(state_dict.values()).index(st.session_state['zip_state'])
-    st.session_state['default_metro'] = 0
-    st.session_state['default_counties'] = sorted(df['County'].unique())[0]
-    st.session_state['default_cities'] = []    
-    st.session_state['default_zips'] = sorted(df.index)[0]
-
-    df = None
-    state_dict = None
-    chosen_state = None
-    counties = None
-    metro_opts = None
-
-
-def update_metro():
-    chosen_state = st.session_state['chosen_state']
-    chosen_metro = st.session_state['chosen_metro']
-    
-    df = st.session_state['df']
-    df = df[(df['State'] == chosen_state) & (df['Metro'] == chosen_metro)]        
-    counties = sorted(df['County'].unique())
-    
-    df = df.loc[df['County'] == counties[0]]
-    
-    st.session_state['default_metro'] = st.session_state['metro_opts'].index(chosen_metro)
-    st.session_state['default_counties'] = counties[0]
-    st.session_state['default_cities'] = []
-    st.session_state['default_zips'] = sorted(df.index)[0]
-
-    df = None
-    chosen_state = None
-    chosen_metro = None
-    counties = None
-
-
-def update_couties():
-    chosen_state = st.session_state['chosen_state']
-    chosen_metro = st.session_state['chosen_metro']
-    chosen_counties = st.session_state['chosen_counties']
-    chosen_cities = st.session_state['chosen_cities']
-    
-    if 'chosen_zips' in st.session_state:
-        chosen_zips = st.session_state['chosen_zips']
-    else:
-        chosen_zips = []
-    
-    # Re-Initialize Default Counties/Cities
-    st.session_state['default_counties'] = []
-    st.session_state['default_cities'] = []
-    st.session_state['default_zips'] = []
-    
-    df = st.session_state['df']
-    df = df.loc[(df['State'] == chosen_state) & (df['Metro'] == chosen_metro)]
-    
-    # Update Default Counties
-    st.session_state['default_counties'] = chosen_counties
-    
-    # Update Default Cities
-    if len(chosen_counties) > 0:
-        df = df.loc[df['County'].isin(chosen_counties)]
-        cities = sorted(df['City'].unique())
-        
-        for city in chosen_cities:
-            if city in cities:
-                st.session_state['default_cities'].append(city)
-    else:
-        st.session_state['default_cities'] = chosen_cities
-    
-    if len(st.session_state['default_cities']) > 0:
-        df = df.loc[df['City'].isin(chosen_cities)]
-
-    zip_codes = sorted(df.index)
-    for zip_code in chosen_zips:
-        if zip_code in zip_codes:
-            st.session_state['default_zips'].append(zip_code)
-
-    if len(st.session_state['default_zips']) == 0:
-        st.session_state['default_zips'] = zip_codes[0]
-
-    df = None
-    chosen_state = None
-    chosen_metro = None
-    chosen_counties = None
-    chosen_cities = None
-    chosen_zips = None
-    cities = None
-    zip_codes = None
-
-
-def update_cities():
-    chosen_state = st.session_state['chosen_state']
-    chosen_metro = st.session_state['chosen_metro']
-    chosen_counties = st.session_state['chosen_counties']
-    chosen_cities = st.session_state['chosen_cities']
-    st.session_state['default_zips'] = []
-
-    if 'chosen_zips' in st.session_state:
-        chosen_zips = st.session_state['chosen_zips']
-    else:
-        chosen_zips = []
-
-    df = st.session_state['df']
-    df = df[(df['State'] == chosen_state) & (df['Metro'] == chosen_metro)]
-    
-    if len(chosen_counties) > 0:
-        df = df.loc[df['County'].isin(chosen_counties)]
-    
-    if len(chosen_cities) > 0:
-        df = df.loc[df['City'].isin(chosen_cities)]
-    
-    zip_codes = sorted(df.index)
-    for zip_code in chosen_zips:
-        if zip_code in zip_codes:
-            st.session_state['default_zips'].append(zip_code)
-
-    if len(st.session_state['default_zips']) == 0:
-        st.session_state['default_zips'] = zip_codes[0]
-    
-    st.session_state['default_cities'] = st.session_state['chosen_cities']
-
-    df = None
-    chosen_state = None
-    chosen_metro = None
-    chosen_counties = None
-    chosen_cities = None
-    chosen_zips = None
-    zip_codes = None
-
-
-def update_zips():
-    st.session_state['default_zips'] = st.session_state['chosen_zips']
-
-
-def update_zip_toggle():
-    st.session_state['zip_toggle_pos'] = st.session_state['zip_toggle']
+# Chart frames and table orders by (dataset, filter, timeframe), so toggling back to a recent view skips rebuilding it
+if 'historic_views' not in st.session_state:
+    st.session_state['historic_views'] = LRUCache(max_entries=16)
 
 
 def update_chrt_dtbl():
@@ -220,18 +33,11 @@ def update_timeframe():
     timeframe = None
 
 
-def load_geometries(state:str):
-    for file in listdir(GEOMETRY_DIR):
-        state = state.lower()
+def update_resolution():
+    resolution = ['Auto', 'Monthly', 'Quarterly', 'Yearly']
+    st.session_state['default_resolution'] = resolution.index(st.session_state['chosen_resolution'])
+    resolution = None
 
-        if file[0:2] == state:
-            return gpd.read_feather(GEOMETRY_DIR / file)
-
-
-# Load Data
-if 'df' not in st.session_state:
-    st.session_state['df'] = load_data()
-    st.session_state['val_dates'] = sorted(st.session_state['df'].columns[4:])
 
 # Page Header
 st.write('<h1 style=text-align:center>Average Single Family Residence (SFR) Values</h1>', unsafe_allow_html=True)
@@ -239,117 +45,119 @@ st.write('<h4 style=text-align:center>by ZIP Code</h4>', unsafe_allow_html=True)
 st.write('<p style=text-align:center>(Data Provided by Zillow Group)</p>', unsafe_allow_html=True)
 
 # Filter Expander
-with st.expander('Filter Your Area Search', expanded=True):
-    # Main Filter Layout
-    r1col1, r1col2 = st.columns(2)
-    r2col1, r2col2 = st.columns(2)
-
-    # State Filter
-    with r1col1:
-        st.session_state['state_opts'] = sorted(st.session_state['df']['State'].unique())
-        slctd_state = st.selectbox('Choose a State', st.session_state['state_opts'], st.session_state['default_state'], key='chosen_state', on_change=update_state)
-        st.session_state['filtered_df'] = st.session_state['df'][st.session_state['df']['State'] == slctd_state]
-        
-        # Load ZIP Geometries for the State
-        st.session_state['zip_geos'] = load_geometries(slctd_state)
-    # Metroplex Filter
-    with r1col2:
-        st.session_state['metro_opts'] = sorted(st.session_state['filtered_df']['Metro'].unique())
-        
-        # Make "Unrecognized Metroplex" the last option
-        if 'Unrecognized Metroplex' in st.session_state['metro_opts']:
-            st.session_state['metro_opts'].remove('Unrecognized Metroplex')
-            st.session_state['metro_opts'].append('Unrecognized Metroplex')
-        
-        slctd_metro = st.selectbox('Choose a Metroplex', st.session_state['metro_opts'], st.session_state['default_metro'], key='chosen_metro', on_change=update_metro)
-        st.session_state['filtered_df'] = st.session_state['filtered_df'][st.session_state['filtered_df']['Metro'] == slctd_metro]
-
-    # County Filter
-    with r2col1:
-        st.session_state['county_opts'] = sorted(st.session_state['filtered_df']['County'].unique())
-        slctd_county = st.multiselect('Choose a County', st.session_state['county_opts'], st.session_state['default_counties'], key='chosen_counties', on_change=update_couties)
-        if len(slctd_county) > 0:
-            st.session_state['filtered_df'] = st.session_state['filtered_df'][st.session_state['filtered_df']['County'].isin(slctd_county)]
-
-    # City Filter
-    with r2col2:
-        st.session_state['city_opts'] = sorted(st.session_state['filtered_df']['City'].unique())
-        
-        slctd_city = st.multiselect('Choose a City', st.session_state['city_opts'], st.session_state['default_cities'], key='chosen_cities', on_change=update_cities)
-        if len(slctd_city) > 0:
-            st.session_state['filtered_df'] = st.session_state['filtered_df'][st.session_state['filtered_df']['City'].isin(slctd_city)]
-
-    # ZIP Filter Layout
-    zip_col1, zip_col2 =st.columns([.25, .75])
-    
-    # ZIP Filter Toggle
-    with zip_col1:
-        zip_fltr = st.toggle('Choose ZIPs', key='zip_toggle', value=st.session_state['zip_toggle_pos'], on_change=update_zip_toggle)
-
-    # ZIP Filter
-    if zip_fltr:
-        zip_slctr = st.multiselect('Choose your ZIP Codes', sorted(st.session_state['filtered_df'].index), st.session_state['default_zips'], key='chosen_zips', on_change=update_zips)
-        st.session_state['filtered_df'] = st.session_state['filtered_df'].loc[zip_slctr]
-
-# Create historic dataframe
-st.session_state['historic_data'] = st.session_state['filtered_df'].iloc[:,4:].transpose()
+selection = filter_expander()
 
 # Line Chart
 st.subheader('Value History')
 
+tf_col, res_col = st.columns(2)
+
 # Select the Line Chart Timeframe
-timeframe = st.selectbox('Timeframe', ['3yrs', '5yrs', '10yrs', 'Max (Since 2000)'], st.session_state['default_timeframe'], key='chosen_timeframe', on_change=update_timeframe)
+with tf_col:
+    timeframe = st.selectbox('Timeframe', ['3yrs', '5yrs', '10yrs', 'Max (Since 2000)'], st.session_state['default_timeframe'], key='chosen_timeframe', on_change=update_timeframe)
 
-# Display Line Chart Based on Timeframe
+# Select the Line Chart Resolution (Auto keeps long timeframes within the point budget)
+with res_col:
+    resolution = st.selectbox('Resolution', ['Auto', 'Monthly', 'Quarterly', 'Yearly'], st.session_state['default_resolution'], key='chosen_resolution', on_change=update_resolution)
+
+# Months Covered by the Timeframe
 match timeframe:
     case '3yrs':
-        st.line_chart(st.session_state['historic_data'].iloc[-37:])
+        tf_dates = slice(-37, None)
     case '5yrs':
-        st.line_chart(st.session_state['historic_data'].iloc[-61:])
+        tf_dates = slice(-61, None)
     case '10yrs':
-        st.line_chart(st.session_state['historic_data'].iloc[-121:])
+        tf_dates = slice(-121, None)
     case 'Max (Since 2000)':
-        st.line_chart(st.session_state['historic_data'])
+        tf_dates = slice(None)
+
+historic_views = st.session_state['historic_views']
+view_key = (selection.data.checksum, selection.key, timeframe)
+
+# Large selections are summarized as percentile bands and a mean across their ZIPs
+if len(selection.zip_codes) > AGGREGATE_ZIP_COUNT:
+    st.caption(f'Showing the spread of values across all {len(selection.zip_codes):,} ZIPs. Narrow the filter to {AGGREGATE_ZIP_COUNT} ZIPs or fewer to see one line per ZIP.')
+
+st.session_state['historic_data'] = historic_views.get(('chart', *view_key, resolution))
+
+if st.session_state['historic_data'] is None:
+    # Month x ZIP view of the value matrix, reduced to the chosen resolution
+    chart_vals = selection.values[:, tf_dates].T
+    chart_dates = st.session_state['val_dates'][tf_dates]
+
+    match resolution:
+        case 'Auto':
+            if len(chart_dates) > POINT_BUDGET:
+                chart_pos = downsample_positions(chart_vals)
+                chart_vals = chart_vals[chart_pos]
+                chart_dates = [chart_dates[pos] for pos in chart_pos]
+        case 'Quarterly':
+            chart_vals, chart_dates = aggregate_periods(chart_vals, chart_dates, 3)
+        case 'Yearly':
+            chart_vals, chart_dates = aggregate_periods(chart_vals, chart_dates, 12)
+
+    # Create historic dataframe
+    if len(selection.zip_codes) > AGGREGATE_ZIP_COUNT:
+        st.session_state['historic_data'] = pd.DataFrame(band_values(chart_vals), index=chart_dates, columns=BAND_NAMES)
+    else:
+        st.session_state['historic_data'] = pd.DataFrame(chart_vals, index=chart_dates, columns=selection.zip_codes, copy=False)
+
+    historic_views.put(('chart', *view_key, resolution), st.session_state['historic_data'])
+
+# Display Line Chart Based on Timeframe
+st.line_chart(st.session_state['historic_data'])
 
 # Display Relevant Data Table
 if st.checkbox('View the Full List', st.session_state['chrt_dtbl_view'], key='chrt_dtbl', on_change=update_chrt_dtbl):
-    
-    rm_cols = ['Metro', 'County', 'State']
-    
-    match timeframe:
-        case '3yrs':
-            cols = ['City'] + st.session_state['val_dates'][-37:]
-            st.dataframe(
-                st.session_state['filtered_df'].sort_values(st.session_state['filtered_df'].columns[-1], ascending=False).drop(columns=rm_cols)[cols]
-            )
-        case '5yrs':
-            cols = ['City'] + st.session_state['val_dates'][-61:]
-            st.dataframe(
-                st.session_state['filtered_df'].sort_values(st.session_state['filtered_df'].columns[-1], ascending=False).drop(columns=rm_cols)[cols]
-            )
-        case '10yrs':
-            cols = ['City'] + st.session_state['val_dates'][-121:]
-            st.dataframe(
-                st.session_state['filtered_df'].sort_values(st.session_state['filtered_df'].columns[-1], ascending=False).drop(columns=rm_cols)[cols]
-            )
-        case 'Max (Since 2000)':
-            st.dataframe(
-                st.session_state['filtered_df'].sort_values(st.session_state['filtered_df'].columns[-1], ascending=False).drop(columns=rm_cols)
-            )
+    cols = st.session_state['val_dates'][tf_dates]
+
+    # Growth over the timeframe comes straight from the precomputed metric cube
+    tbl_metrics = {
+        name: selection.data.metrics.layer(name)[selection.rows, -1]
+        for name in [f'{timeframe} Growth', f'{timeframe} CAGR']
+    }
+
+    tbl_sort = st.selectbox('Sort By', ['Latest Value', 'Growth', 'CAGR'], key='chrt_tbl_sort')
+
+    # Highest first, ZIPs without a value last
+    tbl_order = historic_views.get(('table', *view_key, tbl_sort))
+
+    if tbl_order is None:
+        if tbl_sort == 'Latest Value':
+            tbl_order = descending_order(selection.values[:, -1])
+        else:
+            tbl_order = descending_order(tbl_metrics[f'{timeframe} {tbl_sort}'])
+
+        historic_views.put(('table', *view_key, tbl_sort), tbl_order)
+
+    # Only the chosen months of the visible page of ZIPs are sent
+    tbl_months = st.select_slider('Months Shown', cols, (cols[-min(DEFAULT_TABLE_MONTHS, len(cols))], cols[-1]), key=f'chrt_tbl_months_{timeframe}')
+    tbl_cols = selection.data.date_slice(*tbl_months)
+    tbl_rows = tbl_order[table_pager('chrt_tbl', len(tbl_order))]
+
+    tbl_df = pd.concat([
+        st.session_state['filtered_df'][['City']].take(tbl_rows),
+        pd.DataFrame({name: vals[tbl_rows] for name, vals in tbl_metrics.items()}, index=st.session_state['filtered_df'].index[tbl_rows]),
+        pd.DataFrame(selection.values[tbl_rows, tbl_cols], index=st.session_state['filtered_df'].index[tbl_rows], columns=selection.data.dates[tbl_cols]),
+    ], axis=1)
+
+    st.dataframe(tbl_df, column_config={name: st.column_config.NumberColumn(format='percent') for name in tbl_metrics})
 
 # Empty Unused Variables
-r1col1 = None
-r1col2 = None
-r2col1 = None
-r2col2 = None
-slctd_state = None
-slctd_metro = None
-slctd_county = None
-slctd_city = None
-zip_fltr = None
-zip_slctr = None
-zip_col1 = None
-zip_col2 = None
+selection = None
 timeframe = None
-rm_cols = None
-cols = None
\ No newline at end of file
+resolution = None
+historic_views = None
+view_key = None
+tf_dates = None
+chart_vals = None
+chart_dates = None
+chart_pos = None
+cols = None
+tbl_metrics = None
+tbl_sort = None
+tbl_order = None
+tbl_months = None
+tbl_cols = None
+tbl_rows = None
+tbl_df = None
\ No newline at end of file
@@ -0,0 +1,148 @@
+import numpy as np
+import streamlit as st
+import pydeck as pdk
+from sfr.data import load_data, sidecar_dir, tile_dir
+from sfr.filters import init_filter_state
+from sfr.stats import quantile_scale
+from sfr.tiles import TILE_VIEWS, load_tile_set
+from datetime import datetime as dt
+
+st.set_page_config(page_title="Avg SFR Values National Map", layout='wide', page_icon=':house:', initial_sidebar_state='collapsed')
+
+init_filter_state()
+
+# Where the map centers before a state is chosen
+US_CENTER = (39.5, -98.35)
+
+if 'default_natl_view' not in st.session_state:
+    st.session_state['default_natl_view'] = 0
+
+if 'default_natl_center' not in st.session_state:
+    st.session_state['default_natl_center'] = 0
+
+if 'default_natl_metric' not in st.session_state:
+    st.session_state['default_natl_metric'] = 0
+
+if 'date_slider' not in st.session_state:
+    st.session_state['date_slider'] = None
+
+
+def update_natl_view():
+    st.session_state['default_natl_view'] = list(TILE_VIEWS).index(st.session_state['chosen_natl_view'])
+
+
+def update_natl_center():
+    st.session_state['default_natl_center'] = st.session_state['natl_center_opts'].index(st.session_state['chosen_natl_center'])
+
+
+def update_natl_metric():
+    natl_metric = ['Value', 'YoY Change']
+    st.session_state['default_natl_metric'] = natl_metric.index(st.session_state['chosen_natl_metric'])
+    natl_metric = None
+
+
+def update_natl_date():
+    st.session_state['date_slider'] = st.session_state['chosen_natl_date']
+
+
+# Page Header
+st.write('<h1 style=text-align:center>Average Single Family Residence (SFR) Values</h1>', unsafe_allow_html=True)
+st.write('<h4 style=text-align:center>Across the Country</h4>', unsafe_allow_html=True)
+st.write('<p style=text-align:center>(Data Provided by Zillow Group)</p>', unsafe_allow_html=True)
+
+# Tiles Pre-Aggregated by data_prep/prepare.py for This Dataset
+data = load_data()
+tile_set = load_tile_set(data.checksum, tile_dir(sidecar_dir(data.path)), len(data.dates))
+
+if tile_set is None:
+    st.info('The national map has not been built for this dataset yet. Run data_prep/prepare.py to build its tiles.')
+    st.stop()
+
+# Map Controls
+view_col, center_col, metric_col = st.columns(3)
+
+with view_col:
+    natl_view = st.selectbox('Detail', list(TILE_VIEWS), st.session_state['default_natl_view'], key='chosen_natl_view', on_change=update_natl_view)
+
+with center_col:
+    st.session_state['natl_center_opts'] = ['Contiguous US'] + sorted(tile_set.centers)
+    natl_center = st.selectbox('Center On', st.session_state['natl_center_opts'], st.session_state['default_natl_center'], key='chosen_natl_center', on_change=update_natl_center)
+
+with metric_col:
+    natl_metric = st.selectbox('Color By', ['Value', 'YoY Change'], st.session_state['default_natl_metric'], key='chosen_natl_metric', on_change=update_natl_metric)
+
+# Select Value Date (shared with the Heat Map)
+if st.session_state['date_slider'] in st.session_state['val_dates']:
+    date_fltr = st.select_slider('Select Date (YYYY-MM-DD)', st.session_state['val_dates'], st.session_state['date_slider'], key='chosen_natl_date', on_change=update_natl_date)
+else:
+    date_fltr = st.select_slider('Select Date (YYYY-MM-DD)', st.session_state['val_dates'], st.session_state['val_dates'][-1], key='chosen_natl_date', on_change=update_natl_date)
+
+date_pos = data.date_pos[date_fltr]
+dsply_date = dt.strftime(dt.strptime(date_fltr,'%Y-%m-%d'),'%B, %Y')
+
+# Only the Tiles Overlapping the View are Read
+map_zoom, tile_zoom = TILE_VIEWS[natl_view]
+map_lat, map_lon = US_CENTER if natl_center == 'Contiguous US' else tile_set.centers[natl_center]
+view_tiles = tile_set.tiles_in_view(map_lat, map_lon, map_zoom, tile_zoom)
+cell_df = tile_set.cell_frame(tile_zoom, view_tiles, date_pos)
+
+# Metric Values of Each Cell's Median ZIP Value
+match natl_metric:
+    case 'Value':
+        metric_vals = cell_df['Median'].to_numpy() / 1000
+    case 'YoY Change':
+        metric_vals = cell_df['Median'].to_numpy() / cell_df['Prior Median'].to_numpy() - 1
+
+# Colors run from yellow to red across the visible cells' 5th to 95th percentiles
+color_scale = quantile_scale(metric_vals)
+cell_df['G_Value'] = np.nan_to_num(255 * (1 - color_scale))
+cell_df['A_Value'] = np.where(np.isnan(color_scale), 0, 255)
+
+if natl_metric == 'YoY Change':
+    st.subheader(f'Median ZIP Values of {dsply_date} (YoY Change)')
+else:
+    st.subheader(f'Median ZIP Values of {dsply_date}')
+
+st.caption(f'{len(cell_df):,} grid cells from {len(view_tiles)} of the {len(tile_set.tiles[tile_zoom])} tiles at this detail. Each cell shows the median of the ZIPs inside it.')
+
+# Display National Map
+st.pydeck_chart(pdk.Deck(
+        map_style=None,
+        initial_view_state=pdk.ViewState(
+            latitude=map_lat,
+            longitude=map_lon,
+            zoom=map_zoom,
+            pitch=0,
+        ),
+        layers=pdk.Layer(
+            'PolygonLayer',
+            data=cell_df.drop(columns=['Prior Median']),
+            get_polygon='polygon',
+            position_format=pdk.types.String('XY'),
+            opacity=0.7,
+            stroked=False,
+            pickable=True,
+            get_fill_color='[255, G_Value, 0, A_Value]',
+        ),
+    ))
+
+# Empty Unused Variables
+data = None
+tile_set = None
+view_col = None
+center_col = None
+metric_col = None
+natl_view = None
+natl_center = None
+natl_metric = None
+date_fltr = None
+date_pos = None
+dsply_date = None
+map_zoom = None
+tile_zoom = None
+map_lat = None
+map_lon = None
+view_tiles = None
+cell_df = None
+metric_vals = None
+color_scale = None
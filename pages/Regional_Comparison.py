@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from sfr.filters import init_filter_state, filter_expander
+
+st.set_page_config(page_title="Avg SFR Regional Comparison", layout='wide', page_icon=':house:', initial_sidebar_state='collapsed')
+
+init_filter_state()
+
+# Plural labels of the region levels
+LEVEL_PLURALS = {'Metro': 'Metros', 'County': 'Counties', 'City': 'Cities'}
+
+if 'default_region_level' not in st.session_state:
+    st.session_state['default_region_level'] = 0
+
+if 'default_region_stat' not in st.session_state:
+    st.session_state['default_region_stat'] = 0
+
+if 'default_region_timeframe' not in st.session_state:
+    st.session_state['default_region_timeframe'] = 0
+
+
+def update_region_level():
+    levels = ['Metro', 'County', 'City']
+    st.session_state['default_region_level'] = levels.index(st.session_state['chosen_region_level'])
+    levels = None
+
+
+def update_region_stat():
+    stats = ['Median', 'Mean']
+    st.session_state['default_region_stat'] = stats.index(st.session_state['chosen_region_stat'])
+    stats = None
+
+
+def update_region_timeframe():
+    timeframe = ['3yrs', '5yrs', '10yrs', 'Max (Since 2000)']
+    st.session_state['default_region_timeframe'] = timeframe.index(st.session_state['chosen_region_timeframe'])
+    timeframe = None
+
+
+# Page Header
+st.write('<h1 style=text-align:center>Average Single Family Residence (SFR) Values</h1>', unsafe_allow_html=True)
+st.write('<h4 style=text-align:center>by Region</h4>', unsafe_allow_html=True)
+st.write('<p style=text-align:center>(Data Provided by Zillow Group)</p>', unsafe_allow_html=True)
+
+# Filter Expander
+selection = filter_expander()
+
+# Region Controls
+st.subheader('Regional Comparison')
+
+level_col, stat_col, tf_col = st.columns(3)
+
+with level_col:
+    level = st.selectbox('Region Level', ['Metro', 'County', 'City'], st.session_state['default_region_level'], key='chosen_region_level', on_change=update_region_level)
+
+with stat_col:
+    stat = st.selectbox('Statistic', ['Median', 'Mean'], st.session_state['default_region_stat'], key='chosen_region_stat', on_change=update_region_stat)
+
+with tf_col:
+    timeframe = st.selectbox('Timeframe', ['3yrs', '5yrs', '10yrs', 'Max (Since 2000)'], st.session_state['default_region_timeframe'], key='chosen_region_timeframe', on_change=update_region_timeframe)
+
+# Months Covered by the Timeframe
+match timeframe:
+    case '3yrs':
+        tf_dates = slice(-37, None)
+    case '5yrs':
+        tf_dates = slice(-61, None)
+    case '10yrs':
+        tf_dates = slice(-121, None)
+    case 'Max (Since 2000)':
+        tf_dates = slice(None)
+
+# Regions of the filtered states, read from the precomputed region cube rather than re-aggregating ZIP rows
+rollup = selection.data.rollups[level]
+region_pos, region_names = rollup.state_regions(selection.states)
+
+# Regions covering the current filter are chosen first
+filter_regions = set(rollup.row_regions[selection.rows].tolist())
+default_regions = [name for pos, name in zip(region_pos, region_names) if pos in filter_regions][:10]
+
+# The chosen regions are kept per set of states and level, since names differ between them
+chosen_names = st.multiselect(f'{LEVEL_PLURALS[level]} to Compare', region_names, default_regions, key=f"chosen_regions_{'_'.join(selection.states)}_{level}")
+chosen_pos = region_pos[[region_names.index(name) for name in chosen_names]]
+
+if len(chosen_names) == 0:
+    st.info(f'Choose one or more {LEVEL_PLURALS[level].lower()} to compare.')
+else:
+    # Line Chart of the Chosen Stat
+    region_vals = rollup.stat(stat)[chosen_pos][:, tf_dates]
+    st.line_chart(pd.DataFrame(region_vals.T, index=selection.data.dates[tf_dates], columns=chosen_names))
+
+    # Latest Stats and Growth over the Timeframe
+    stat_vals = {name: rollup.stat(name)[chosen_pos, -1] for name in ['Median', 'Mean', 'ZIPs']}
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stat_vals[f'{timeframe} Growth'] = region_vals[:, -1] / region_vals[:, 0] - 1
+
+    region_df = pd.DataFrame(stat_vals, index=pd.Index(chosen_names, name=level))
+    region_df['ZIPs'] = region_df['ZIPs'].astype(int)
+    region_df = region_df.sort_values(stat, ascending=False)
+
+    st.dataframe(region_df, column_config={f'{timeframe} Growth': st.column_config.NumberColumn(format='percent')})
+
+# Empty Unused Variables
+selection = None
+level = None
+stat = None
+timeframe = None
+tf_dates = None
+rollup = None
+region_pos = None
+region_names = None
+filter_regions = None
+default_regions = None
+chosen_names = None
+chosen_pos = None
+region_vals = None
+stat_vals = None
+region_df = None
+level_col = None
+stat_col = None
+tf_col = None
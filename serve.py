@@ -0,0 +1,9 @@
+import sys
+from streamlit.web import bootstrap
+from sfr.warmup import start_warmup
+
+# Run from the repository root instead of streamlit run Home.py: python serve.py [script args]
+# Data, the filter index and the busiest states' map shapes load while the server starts, not on the first visit
+if __name__ == '__main__':
+    start_warmup()
+    bootstrap.run('Home.py', False, sys.argv[1:], {})
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    # Evicts least recently used entries past max_entries, or past max_bytes as measured by sizeof
+    def __init__(self, max_entries=None, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _over_limit(self):
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            return True
+
+        return self.max_bytes is not None and self.total_bytes > self.max_bytes
+
+    def get(self, key, default=None):
+        if key not in self._entries:
+            return default
+
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key, value):
+        if key in self._entries:
+            self.total_bytes -= self._sizes.pop(key)
+
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self._sizes[key] = 0 if self.sizeof is None else self.sizeof(value)
+        self.total_bytes += self._sizes[key]
+
+        # The newest entry is always kept, even when it alone exceeds max_bytes
+        while len(self._entries) > 1 and self._over_limit():
+            old_key, _ = self._entries.popitem(last=False)
+            self.total_bytes -= self._sizes.pop(old_key)
+
+    def clear(self):
+        self._entries.clear()
+        self._sizes.clear()
+        self.total_bytes = 0
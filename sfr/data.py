@@ -0,0 +1,285 @@
+import hashlib
+import json
+import threading
+import time
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import streamlit as st
+from pathlib import Path
+from sfr.metrics import MetricCube, compute_metrics, read_metric_cube
+from sfr.rollups import compute_rollups, read_rollups
+
+DATA_DIR = Path('zhvi-sfr-zip')
+MANIFEST_FILE = DATA_DIR / 'manifest.json'
+
+# Unversioned artifact of older builds, served as-is when there is no manifest
+DATA_FILE = DATA_DIR / 'zhvi.feather'
+META_COLS = ['State', 'City', 'Metro', 'County']
+
+# How often a running server looks for a newer artifact
+RELOAD_CHECK_SECONDS = 60
+
+# Called with a newly loaded dataset on the reload thread, before it is swapped in
+RELOAD_WARMERS = []
+
+
+def on_reload(warm):
+    # Registers a cache to fill for a reloaded dataset before any session is handed it; modules that build on the
+    # dataset register themselves, so this one never imports them
+    RELOAD_WARMERS.append(warm)
+    return warm
+
+
+def artifact_file(version, checksum, data_dir=DATA_DIR):
+    # Every build gets its own file name, so publishing one never rewrites a file a running server has open
+    return data_dir / f'zhvi-{version}-{checksum[:8]}.feather'
+
+
+def sidecar_dir(data_file):
+    # Metric, region and tile sidecars of one artifact, in a directory named after it
+    return Path(data_file).with_suffix('')
+
+
+def values_file(sidecars):
+    return sidecars / 'values.npy'
+
+
+def metrics_file(sidecars):
+    return sidecars / 'metrics.npy'
+
+
+def rollup_dir(sidecars):
+    return sidecars / 'rollups'
+
+
+def tile_dir(sidecars):
+    return sidecars / 'tiles'
+
+
+class ZHVIData:
+    # ZIP metadata frame plus a contiguous ZIP x month value matrix; rows of both line up by position
+    def __init__(self, meta, values, dates, version=None, checksum=None, metrics=None, rollups=None, path=None):
+        self.meta = meta
+        self.values = values
+        self.values.flags.writeable = False
+        self.dates = dates
+        self.date_pos = {date: pos for pos, date in enumerate(dates)}
+        self.version = version
+        self.checksum = checksum
+        self._metrics = metrics
+        self._rollups = rollups
+        self.path = path
+
+    @property
+    def metrics(self):
+        # Growth metrics come from the artifact's sidecar; without a matching one they are computed once, on first use
+        if self._metrics is None:
+            self._metrics = MetricCube(compute_metrics(self.values))
+
+        return self._metrics
+
+    @property
+    def rollups(self):
+        # Metro, County and City aggregates by level, likewise from the artifact's sidecar when it matches
+        if self._rollups is None:
+            self._rollups = compute_rollups(self.meta, self.values)
+
+        return self._rollups
+
+    def date_slice(self, start_date=None, end_date=None):
+        start = None if start_date is None else self.date_pos[start_date]
+        stop = None if end_date is None else self.date_pos[end_date] + 1
+        return slice(start, stop)
+
+    def frame(self, rows=None, dates=None):
+        # Wide frame in the original zhvi.feather shape, built only for display
+        meta = self.meta if rows is None else self.meta.take(rows)
+        values = self.values if rows is None else self.values[rows]
+
+        if dates is None:
+            dates = self.dates
+        else:
+            values = values[:, [self.date_pos[date] for date in dates]]
+
+        return pd.concat([meta, pd.DataFrame(values, index=meta.index, columns=dates)], axis=1)
+
+
+def values_info_file(matrix_file):
+    return matrix_file.with_suffix('.json')
+
+
+def write_value_matrix(data_file, matrix_file, checksum):
+    # ZIP x month float32 matrix of the artifact at data_file in its in-memory layout, one record batch of rows at a
+    # time, stamped with the artifact's checksum, so servers memory-map it instead of decompressing and transposing
+    reader = pa.ipc.open_file(pa.memory_map(str(data_file)))
+    dates = [name for name in reader.schema.names if name not in META_COLS and name != 'ZIP']
+
+    temp_file = matrix_file.with_name(matrix_file.name + '.tmp')
+    matrix = np.lib.format.open_memmap(temp_file, 'w+', np.float32, (reader.count_rows(), len(dates)))
+    start = 0
+
+    for pos in range(reader.num_record_batches):
+        batch = reader.get_batch(pos)
+        matrix[start:start + batch.num_rows] = np.column_stack([batch.column(date).to_numpy(zero_copy_only=False) for date in dates])
+        start += batch.num_rows
+
+    matrix.flush()
+    matrix = None
+    os.replace(temp_file, matrix_file)
+
+    info_file = values_info_file(matrix_file)
+    info_temp = info_file.with_name(info_file.name + '.tmp')
+    with open(info_temp, 'w') as file:
+        json.dump({'sha256': checksum}, file, indent=2)
+
+    os.replace(info_temp, info_file)
+
+
+def read_value_matrix(matrix_file, checksum, shape):
+    # Memory-mapped read-only, so loading costs no copy and every process shares the page cache; None when missing,
+    # built for another artifact or not shaped like its (ZIPs, months) matrix
+    try:
+        with open(values_info_file(matrix_file)) as file:
+            info = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if checksum is None or info['sha256'] != checksum:
+        return None
+
+    matrix = np.load(matrix_file, mmap_mode='r')
+
+    if matrix.shape != shape or matrix.dtype != np.float32:
+        return None
+
+    return matrix
+
+
+def read_dataset(path, checksum=None):
+    # Geography columns arrive as categoricals straight from the Arrow layout; month columns are only read when the
+    # artifact has no matching value matrix sidecar
+    schema = pa.ipc.open_file(pa.memory_map(str(path))).schema
+    version = (schema.metadata or {}).get(b'version')
+    dates = [name for name in schema.names if name not in META_COLS and name != 'ZIP']
+
+    table = feather.read_table(path, columns=['ZIP'] + META_COLS, memory_map=True)
+    meta = table.select(META_COLS).to_pandas()
+
+    # ZIPs are stored as fixed-width integer codes
+    meta.index = pd.Index(np.char.zfill(table.column('ZIP').to_numpy().astype(str), 5), name='ZIP')
+
+    # Sidecars are only used when stamped with this artifact's checksum and shaped like its matrix
+    shape = (table.num_rows, len(dates))
+    values = read_value_matrix(values_file(sidecar_dir(path)), checksum, shape)
+    metrics = read_metric_cube(metrics_file(sidecar_dir(path)), checksum, shape)
+    rollups = read_rollups(rollup_dir(sidecar_dir(path)), checksum, shape)
+
+    if values is None:
+        # Each month column is copied once, straight into a ZIP-major matrix so each ZIP's history is contiguous
+        table = feather.read_table(path, columns=dates, memory_map=True)
+        values = np.empty(shape, dtype=np.float32)
+        for pos, date in enumerate(dates):
+            values[:, pos] = table.column(date).to_numpy()
+
+    return ZHVIData(meta, values, dates, None if version is None else version.decode(), checksum, metrics, rollups, Path(path))
+
+
+def read_manifest(path=MANIFEST_FILE):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def manifest_artifact(manifest_file=MANIFEST_FILE):
+    # Path and checksum of the published artifact; without a manifest, the unversioned file and no checksum
+    manifest = read_manifest(manifest_file)
+
+    if manifest is None:
+        return DATA_FILE, None
+
+    return manifest_file.with_name(manifest['file']), manifest['sha256']
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(2**20), b''):
+            sha256.update(block)
+
+    return sha256.hexdigest()
+
+
+class DatasetManager:
+    # Serves the current dataset and hot-swaps a newer one, loaded on a background thread, when the manifest changes.
+    # Sessions hold whichever ZHVIData they were handed, so a swap never changes data under a running script.
+    def __init__(self, manifest_file=MANIFEST_FILE, check_seconds=RELOAD_CHECK_SECONDS):
+        self.manifest_file = manifest_file
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._loading = False
+        self._checked = time.monotonic()
+
+        # Without a manifest the artifact is served as-is for the life of the process. A file that does not match
+        # its manifest is served without a checksum, so no sidecar is trusted and the next check reloads it
+        path, checksum = manifest_artifact(manifest_file)
+        if checksum is not None and file_sha256(path) != checksum:
+            checksum = None
+
+        self._data = read_dataset(path, checksum)
+
+    def current(self):
+        if time.monotonic() - self._checked >= self.check_seconds:
+            self._check()
+
+        return self._data
+
+    def _check(self):
+        with self._lock:
+            if self._loading:
+                return
+
+            self._checked = time.monotonic()
+            manifest = read_manifest(self.manifest_file)
+
+            if manifest is None or manifest['sha256'] == self._data.checksum:
+                return
+
+            self._loading = True
+
+        threading.Thread(target=self._reload, args=(manifest,), daemon=True).start()
+
+    def _reload(self, manifest):
+        try:
+            path = self.manifest_file.with_name(manifest['file'])
+
+            # A checksum mismatch means the file is not the one the manifest describes; the next check tries again
+            if file_sha256(path) == manifest['sha256']:
+                data = read_dataset(path, manifest['sha256'])
+
+                # Sidecars the build is missing and every registered cache are filled here, so no request after the
+                # swap waits on them
+                data.metrics
+                data.rollups
+
+                for warm in RELOAD_WARMERS:
+                    warm(data)
+
+                self._data = data
+        finally:
+            with self._lock:
+                self._loading = False
+
+
+@st.cache_resource(show_spinner='Loading Avg SFR Value Data...')
+def load_dataset_manager():
+    return DatasetManager()
+
+
+# One dataset per server process: every session reads the same buffers, so it must be treated as read-only
+def load_data():
+    return load_dataset_manager().current()
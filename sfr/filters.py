@@ -0,0 +1,345 @@
+import streamlit as st
+from sfr.cache import LRUCache
+from sfr.data import load_data
+from sfr.index import load_filter_index
+from sfr.warmup import start_warmup
+
+# Most bytes of row copies one session keeps for recent filters; the shared matrix itself is never copied whole
+SELECTION_CACHE_BYTES = 16 * 2**20
+
+
+class FilterSelection:
+    def __init__(self, key, index, rows, df, values):
+        self.key = key
+        self.index = index
+        self.rows = rows
+        self.df = df
+        self.values = values
+        self._zip_codes = None
+
+    @property
+    def data(self):
+        # The dataset the rows point into, which may be older than load_data() right after a hot reload
+        return self.index.data
+
+    @property
+    def state(self):
+        return self.key[0]
+
+    @property
+    def states(self):
+        # Every state with a ZIP in the selection, which differs from state once other areas are compared
+        return sorted(self.df['State'].unique().tolist())
+
+    @property
+    def zip_codes(self):
+        if self._zip_codes is None:
+            self._zip_codes = self.df.index.tolist()
+
+        return self._zip_codes
+
+
+def selection_bytes(selection):
+    return selection.values.nbytes + selection.rows.nbytes + int(selection.df.memory_usage().sum())
+
+
+class FilterState:
+    # Memoizes resolved selections by filter key, so reruns and page switches with an unchanged filter skip re-filtering;
+    # capped by bytes too, since a statewide comparison copies far more rows than a single metroplex
+    def __init__(self, max_entries=8, max_bytes=SELECTION_CACHE_BYTES):
+        self.index = None
+        self._selections = LRUCache(max_entries, max_bytes, selection_bytes)
+
+    def resolve(self, index, state, metro, counties, cities, zip_codes=None, areas=()):
+        # A reloaded dataset invalidates every cached row position
+        if index is not self.index:
+            self.index = index
+            self._selections.clear()
+
+        key = (state, metro, tuple(counties), tuple(cities), None if zip_codes is None else tuple(zip_codes), tuple(areas))
+        selection = self._selections.get(key)
+
+        if selection is None:
+            if zip_codes is None:
+                rows = index.area_rows(index.rows(state, metro, counties, cities), areas)
+            else:
+                rows = index.zip_rows(zip_codes)
+
+            data = index.data
+            selection = FilterSelection(key, index, rows, data.meta.take(rows), data.values[rows])
+            self._selections.put(key, selection)
+
+        return selection
+
+
+def init_filter_state():
+    # No-op after the first call in this process
+    start_warmup()
+
+    if 'zip_state' not in st.session_state:
+        st.session_state['zip_state'] = 'Alaska'
+
+    if 'default_state' not in st.session_state:
+        st.session_state['default_state'] = 0
+
+    if 'default_metro' not in st.session_state:
+        st.session_state['default_metro'] = 0
+
+    if 'default_counties' not in st.session_state:
+        st.session_state['default_counties'] = ['Anchorage Borough']
+
+    if 'default_cities' not in st.session_state:
+        st.session_state['default_cities'] = []
+
+    if 'default_zips' not in st.session_state:
+        st.session_state['default_zips'] = ['99501']
+
+    if 'default_compare' not in st.session_state:
+        st.session_state['default_compare'] = []
+
+    if 'zip_toggle_pos' not in st.session_state:
+        st.session_state['zip_toggle_pos'] = False
+
+    if 'filter_state' not in st.session_state:
+        st.session_state['filter_state'] = FilterState()
+
+    if 'val_dates' not in st.session_state:
+        st.session_state['val_dates'] = load_data().dates
+
+
+def update_state():
+    index = load_filter_index()
+    chosen_state = st.session_state['chosen_state']
+    
+    state_dict = {
+        'AK':'Alaska', 'AL':'Alabama', 'AR':'Arkansas', 'AZ':'Arizona', 'CA':'California',
+        'CO':'Colorado', 'CT':'Connecticut', 'DC':'District of Columbia', 'DE':'Delaware',
+        'FL':'Florida', 'GA':'Georgia', 'HI':'Hawaii', 'IA':'Iowa', 'ID':'Idaho',
+        'IL':'Illinois', 'IN':'Indiana', 'KS':'Kansas', 'KY':'Kentucky', 'LA':'Louisiana',
+        'MA':'Massachusetts', 'MD':'Maryland', 'ME':'Maine', 'MI':'Michigan', 'MN':'Minnesota',
+        'MO':'Missouri', 'MS':'Mississippi', 'MT':'Montana', 'NC':'North Carolina',
+        'ND':'North Dakota', 'NE':'Nebraska', 'NH':'New Hampshire','NJ':'New Jersey',
+        'NM':'New Mexico', 'NV':'Nevada', 'NY':'New York', 'OH':'Ohio', 'OK':'Oklahoma',
+        'OR':'Oregon', 'PA':'Pennsylvania', 'RI':'Rhode Island', 'SC':'South Carolina',
+        'SD':'South Dakota', 'TN':'Tennessee', 'TX':'Texas', 'UT':'Utah', 'VA':'Virginia',
+        'VT':'Vermont', 'WA':'Washington', 'WI':'Wisconsin', 'WV':'West Virginia', 'WY':'Wyoming'
+    }
+    
+    metro_opts = index.metro_opts(chosen_state)
+    counties = index.county_opts(chosen_state, metro_opts[0])
+    zip_codes = index.zip_opts(chosen_state, metro_opts[0], counties[:1])
+
+    st.session_state['zip_state'] = state_dict[chosen_state]
+    st.session_state['default_state'] = list(state_dict.values()).index(st.session_state['zip_state'])
+    st.session_state['default_metro'] = 0
+    st.session_state['default_counties'] = counties[0]
+    st.session_state['default_cities'] = []    
+    st.session_state['default_zips'] = zip_codes[0]
+
+    index = None
+    state_dict = None
+    chosen_state = None
+    counties = None
+    metro_opts = None
+    zip_codes = None
+
+
+def update_metro():
+    chosen_state = st.session_state['chosen_state']
+    chosen_metro = st.session_state['chosen_metro']
+    
+    index = load_filter_index()
+    counties = index.county_opts(chosen_state, chosen_metro)
+    zip_codes = index.zip_opts(chosen_state, chosen_metro, counties[:1])
+    
+    st.session_state['default_metro'] = st.session_state['metro_opts'].index(chosen_metro)
+    st.session_state['default_counties'] = counties[0]
+    st.session_state['default_cities'] = []
+    st.session_state['default_zips'] = zip_codes[0]
+
+    index = None
+    chosen_state = None
+    chosen_metro = None
+    counties = None
+    zip_codes = None
+
+
+def update_couties():
+    chosen_state = st.session_state['chosen_state']
+    chosen_metro = st.session_state['chosen_metro']
+    chosen_counties = st.session_state['chosen_counties']
+    chosen_cities = st.session_state['chosen_cities']
+    
+    if 'chosen_zips' in st.session_state:
+        chosen_zips = st.session_state['chosen_zips']
+    else:
+        chosen_zips = []
+    
+    # Re-Initialize Default Counties/Cities
+    st.session_state['default_counties'] = []
+    st.session_state['default_cities'] = []
+    st.session_state['default_zips'] = []
+    
+    index = load_filter_index()
+    
+    # Update Default Counties
+    st.session_state['default_counties'] = chosen_counties
+    
+    # Update Default Cities
+    if len(chosen_counties) > 0:
+        cities = index.city_opts(chosen_state, chosen_metro, chosen_counties)
+        
+        for city in chosen_cities:
+            if city in cities:
+                st.session_state['default_cities'].append(city)
+    else:
+        st.session_state['default_cities'] = chosen_cities
+
+    zip_codes = index.zip_opts(chosen_state, chosen_metro, chosen_counties, st.session_state['default_cities'])
+    for zip_code in chosen_zips:
+        if zip_code in zip_codes:
+            st.session_state['default_zips'].append(zip_code)
+
+    if len(st.session_state['default_zips']) == 0:
+        st.session_state['default_zips'] = zip_codes[0]
+
+    index = None
+    chosen_state = None
+    chosen_metro = None
+    chosen_counties = None
+    chosen_cities = None
+    chosen_zips = None
+    cities = None
+    zip_codes = None
+
+
+def update_cities():
+    chosen_state = st.session_state['chosen_state']
+    chosen_metro = st.session_state['chosen_metro']
+    chosen_counties = st.session_state['chosen_counties']
+    chosen_cities = st.session_state['chosen_cities']
+    st.session_state['default_zips'] = []
+
+    if 'chosen_zips' in st.session_state:
+        chosen_zips = st.session_state['chosen_zips']
+    else:
+        chosen_zips = []
+
+    index = load_filter_index()
+    zip_codes = index.zip_opts(chosen_state, chosen_metro, chosen_counties, chosen_cities)
+    for zip_code in chosen_zips:
+        if zip_code in zip_codes:
+            st.session_state['default_zips'].append(zip_code)
+
+    if len(st.session_state['default_zips']) == 0:
+        st.session_state['default_zips'] = zip_codes[0]
+    
+    st.session_state['default_cities'] = st.session_state['chosen_cities']
+
+    index = None
+    chosen_state = None
+    chosen_metro = None
+    chosen_counties = None
+    chosen_cities = None
+    chosen_zips = None
+    zip_codes = None
+
+
+def update_zips():
+    st.session_state['default_zips'] = st.session_state['chosen_zips']
+
+
+def update_compare():
+    chosen_state = st.session_state['chosen_state']
+    chosen_metro = st.session_state['chosen_metro']
+    chosen_compare = st.session_state['chosen_compare']
+
+    chosen_counties = st.session_state['chosen_counties']
+    chosen_cities = st.session_state['chosen_cities']
+    st.session_state['default_zips'] = []
+
+    if 'chosen_zips' in st.session_state:
+        chosen_zips = st.session_state['chosen_zips']
+    else:
+        chosen_zips = []
+
+    index = load_filter_index()
+    rows = index.area_rows(index.rows(chosen_state, chosen_metro, chosen_counties, chosen_cities), chosen_compare)
+    zip_codes = set(index.zips[rows])
+
+    # Keep the chosen ZIPs that are still in the selection
+    for zip_code in chosen_zips:
+        if zip_code in zip_codes:
+            st.session_state['default_zips'].append(zip_code)
+
+    if len(st.session_state['default_zips']) == 0:
+        st.session_state['default_zips'] = index.zip_opts(chosen_state, chosen_metro, chosen_counties, chosen_cities)[0]
+
+    st.session_state['default_compare'] = chosen_compare
+
+    index = None
+    chosen_state = None
+    chosen_metro = None
+    chosen_counties = None
+    chosen_cities = None
+    chosen_compare = None
+    chosen_zips = None
+    rows = None
+    zip_codes = None
+
+
+def update_zip_toggle():
+    st.session_state['zip_toggle_pos'] = st.session_state['zip_toggle']
+
+
+def filter_expander():
+    index = load_filter_index()
+    filter_state = st.session_state['filter_state']
+
+    with st.expander('Filter Your Area Search', expanded=True):
+        # Main Filter Layout
+        r1col1, r1col2 = st.columns(2)
+        r2col1, r2col2 = st.columns(2)
+
+        # State Filter
+        with r1col1:
+            st.session_state['state_opts'] = index.state_opts()
+            slctd_state = st.selectbox('Choose a State', st.session_state['state_opts'], st.session_state['default_state'], key='chosen_state', on_change=update_state)
+
+        # Metroplex Filter
+        with r1col2:
+            st.session_state['metro_opts'] = index.metro_opts(slctd_state)
+            slctd_metro = st.selectbox('Choose a Metroplex', st.session_state['metro_opts'], st.session_state['default_metro'], key='chosen_metro', on_change=update_metro)
+
+        # County Filter
+        with r2col1:
+            st.session_state['county_opts'] = index.county_opts(slctd_state, slctd_metro)
+            slctd_county = st.multiselect('Choose a County', st.session_state['county_opts'], st.session_state['default_counties'], key='chosen_counties', on_change=update_couties)
+
+        # City Filter
+        with r2col2:
+            st.session_state['city_opts'] = index.city_opts(slctd_state, slctd_metro, slctd_county)
+            slctd_city = st.multiselect('Choose a City', st.session_state['city_opts'], st.session_state['default_cities'], key='chosen_cities', on_change=update_cities)
+
+        # Other States or Metroplexes to Compare (each area is one lookup in the filter index)
+        slctd_areas = st.multiselect('Compare With', index.area_opts(), st.session_state['default_compare'], key='chosen_compare', on_change=update_compare,
+                                     placeholder='Add states or metroplexes')
+
+        selection = filter_state.resolve(index, slctd_state, slctd_metro, slctd_county, slctd_city, areas=slctd_areas)
+
+        # ZIP Filter Layout
+        zip_col1, zip_col2 =st.columns([.25, .75])
+
+        # ZIP Filter Toggle
+        with zip_col1:
+            zip_fltr = st.toggle('Choose ZIPs', key='zip_toggle', value=st.session_state['zip_toggle_pos'], on_change=update_zip_toggle)
+
+        # ZIP Filter
+        if zip_fltr:
+            zip_slctr = st.multiselect('Choose your ZIP Codes', selection.zip_codes, st.session_state['default_zips'], key='chosen_zips', on_change=update_zips)
+            selection = filter_state.resolve(index, slctd_state, slctd_metro, slctd_county, slctd_city, zip_slctr, slctd_areas)
+
+    st.session_state['filtered_df'] = selection.df
+    st.session_state['val_dates'] = selection.data.dates
+
+    return selection
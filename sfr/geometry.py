@@ -0,0 +1,219 @@
+import numpy as np
+import pandas as pd
+import shapely
+import streamlit as st
+from pathlib import Path
+from os import listdir
+from threading import Lock
+from sfr.cache import LRUCache
+
+GEOMETRY_DIR = Path('geometries')
+SIMPLIFIED_DIR = GEOMETRY_DIR / 'simplified'
+GEOMETRY_CACHE_BYTES = 512 * 2**20
+MAP_SHAPES_CACHE_BYTES = 256 * 2**20
+
+# Decimal places kept in map coordinates (about 1 m)
+COORD_DECIMALS = 5
+
+# Levels written by data_prep/simplify_geometries.py; 0 is full resolution, 3 the coarsest
+COARSEST_LEVEL = 3
+
+# The more ZIPs share the map, the coarser their polygons can be: (most ZIPs, level)
+ZIP_COUNT_LEVELS = [(50, 0), (200, 1), (800, 2)]
+
+# Most polygon coordinates sent to the browser for one map (about 8 MB of JSON); larger maps are drawn coarser
+MAP_COORD_BUDGET = 400_000
+
+# Zoom a map opens at when its ZIPs fit in one metroplex, and the widest it zooms out to fit them all
+MAP_ZOOM = 7.75
+MIN_MAP_ZOOM = 2.5
+
+
+def geometry_bytes(gdf):
+    # Shapely objects hide their coordinate buffers from memory_usage, so count them directly
+    coord_bytes = shapely.get_num_coordinates(gdf.geometry.to_numpy()).sum() * 16
+    return int(coord_bytes + gdf.drop(columns=gdf.geometry.name).memory_usage(deep=True).sum())
+
+
+def pick_level(n_zips):
+    return next((level for max_zips, level in ZIP_COUNT_LEVELS if n_zips <= max_zips), COARSEST_LEVEL)
+
+
+class GeometryStore:
+    # (State, level) -> file manifest read once, plus a byte-capped LRU of parsed GeoDataFrames shared by all sessions
+    def __init__(self, geometry_dir=GEOMETRY_DIR, simplified_dir=SIMPLIFIED_DIR, max_bytes=GEOMETRY_CACHE_BYTES):
+        self.manifest = {(file[0:2].upper(), 0): geometry_dir / file for file in listdir(geometry_dir) if file.endswith('.feather')}
+
+        if simplified_dir.exists():
+            for file in listdir(simplified_dir):
+                if file.endswith('.feather'):
+                    level = int(file.removesuffix('.feather').rsplit('_l', 1)[1])
+                    self.manifest[(file[0:2].upper(), level)] = simplified_dir / file
+
+        self._cache = LRUCache(max_bytes=max_bytes, sizeof=geometry_bytes)
+        self._lock = Lock()
+
+    def get(self, state, level=0):
+        state = state.upper()
+
+        # Fall back to the next finer level when a state has not been simplified this far
+        while level > 0 and (state, level) not in self.manifest:
+            level -= 1
+
+        if (state, level) not in self.manifest:
+            return None
+
+        with self._lock:
+            gdf = self._cache.get((state, level))
+
+            if gdf is None:
+                # geopandas is the slowest import in the app, so only the first geometry read pays for it
+                import geopandas as gpd
+
+                gdf = gpd.read_feather(self.manifest[(state, level)])
+                self._cache.put((state, level), gdf)
+
+        return gdf
+
+
+@st.cache_resource
+def load_geometry_store():
+    return GeometryStore()
+
+
+def load_geometries(state:str, level=0):
+    return load_geometry_store().get(state, level)
+
+
+class MapShapes:
+    # Polygon parts of one (state, level) as one rounded coordinate buffer with ring and part offsets, so a cached state
+    # stays close to the size of its GeoDataFrame; Python lists are only built for the parts a map draws
+    def __init__(self, zip_geos):
+        parts, part_src = shapely.get_parts(zip_geos.geometry.to_numpy(), return_index=True)
+        keep = ~shapely.is_empty(parts)
+        parts = parts[keep]
+
+        rings, ring_parts = shapely.get_rings(parts, return_index=True)
+        self.coords = np.round(shapely.get_coordinates(rings), COORD_DECIMALS)
+        self.ring_offsets = np.append(0, np.cumsum(shapely.get_num_coordinates(rings)))
+        self.part_offsets = np.append(0, np.cumsum(np.bincount(ring_parts, minlength=len(parts))))
+
+        self.part_zips = zip_geos['ZCTA5CE10'].to_numpy()[part_src[keep]]
+        self.part_coords = shapely.get_num_coordinates(parts)
+
+        self.centroids = pd.DataFrame({
+            'Latitude': pd.to_numeric(zip_geos['INTPTLAT10']).to_numpy(),
+            'Longitude': pd.to_numeric(zip_geos['INTPTLON10']).to_numpy(),
+        }, index=zip_geos['ZCTA5CE10'])
+
+    def nbytes(self):
+        return int(self.coords.nbytes + self.ring_offsets.nbytes + self.part_offsets.nbytes + self.part_coords.nbytes
+                   + self.part_zips.nbytes + self.centroids.memory_usage(deep=True).sum())
+
+    def polygons(self, part_rows):
+        # Hole-free parts go out as one flat [x, y, x, y, ...] array, the rest as nested rings
+        polygons = np.empty(len(part_rows), dtype=object)
+
+        for pos, part in enumerate(part_rows):
+            ring_starts = self.ring_offsets[self.part_offsets[part]:self.part_offsets[part + 1] + 1]
+
+            if len(ring_starts) == 2:
+                polygons[pos] = self.coords[ring_starts[0]:ring_starts[1]].ravel().tolist()
+            else:
+                polygons[pos] = [self.coords[start:stop].tolist() for start, stop in zip(ring_starts[:-1], ring_starts[1:])]
+
+        return polygons
+
+    def align(self, zip_codes):
+        # Polygon parts drawn for the ZIPs and, for each part, the position of its ZIP in zip_codes
+        zip_pos = pd.Index(zip_codes).get_indexer(self.part_zips)
+        part_rows = np.flatnonzero(zip_pos >= 0)
+        return part_rows, zip_pos[part_rows]
+
+    def centroid_rows(self, zip_codes):
+        return self.centroids.loc[self.centroids.index.intersection(zip_codes)]
+
+
+def view_zoom(centroids):
+    # Closest zoom that still fits every centroid in a roughly 1000 x 500 pixel map, capped at the metroplex zoom
+    lon_span = max(np.ptp(centroids['Longitude']), 1e-6)
+    lat_span = max(np.ptp(centroids['Latitude']), 1e-6)
+    zoom = min(np.log2(360 * 1000 / 256 / lon_span), np.log2(180 * 500 / 256 / lat_span)) - .5
+    return float(np.clip(zoom, MIN_MAP_ZOOM, MAP_ZOOM))
+
+
+class MapLayerFrame:
+    # Polygon parts of one selection from the shapes of every state it covers, aligned to its ZIPs once;
+    # moving the date only swaps the value columns
+    def __init__(self, shapes, zip_codes, level=0):
+        self.zip_codes = pd.Index(zip_codes)
+        self.level = level
+        polygons, zip_rows, coords, centroids = [], [], 0, []
+
+        for state_shapes in shapes:
+            part_rows, state_zip_rows = state_shapes.align(zip_codes)
+            polygons.append(state_shapes.polygons(part_rows))
+            zip_rows.append(state_zip_rows)
+            coords += int(state_shapes.part_coords[part_rows].sum())
+            centroids.append(state_shapes.centroid_rows(zip_codes))
+
+        self.zip_rows = np.concatenate(zip_rows) if len(zip_rows) > 0 else np.empty(0, dtype=np.int64)
+        self.parts = pd.DataFrame({'ZIP': self.zip_codes[self.zip_rows], 'polygon': np.concatenate(polygons) if len(polygons) > 0 else []})
+        self.coords = coords
+
+        # A close view centers on the typical ZIP, a wider one on the middle of all of them
+        centroids = pd.concat(centroids) if len(centroids) > 0 else pd.DataFrame(columns=['Latitude', 'Longitude'], dtype=float)
+        self.zoom = view_zoom(centroids) if len(centroids) > 0 else MAP_ZOOM
+        self.center = centroids.median() if self.zoom == MAP_ZOOM else (centroids.min() + centroids.max()) / 2
+
+    def layer_data(self, map_data):
+        layer_df = self.parts.copy()
+
+        for col in map_data.columns:
+            layer_df[col] = map_data[col].to_numpy()[self.zip_rows]
+
+        return layer_df
+
+
+class MapShapesStore:
+    # Byte-capped LRU of MapShapes shared by all sessions, like the GeometryStore they are built from
+    def __init__(self, max_bytes=MAP_SHAPES_CACHE_BYTES):
+        self._cache = LRUCache(max_bytes=max_bytes, sizeof=MapShapes.nbytes)
+        self._lock = Lock()
+
+    def get(self, state, level=0):
+        with self._lock:
+            shapes = self._cache.get((state, level))
+
+            if shapes is None:
+                zip_geos = load_geometries(state, level)
+
+                if zip_geos is None:
+                    return None
+
+                shapes = MapShapes(zip_geos)
+                self._cache.put((state, level), shapes)
+
+        return shapes
+
+
+@st.cache_resource
+def load_map_shapes_store():
+    return MapShapesStore()
+
+
+def load_map_shapes(state:str, level=0):
+    return load_map_shapes_store().get(state, level)
+
+
+def load_map_frame(states, zip_codes, level=0, max_coords=MAP_COORD_BUDGET):
+    # Only the states the selection covers are read; when their polygons would exceed the coordinate budget,
+    # the next coarser level is tried, up to the coarsest
+    while True:
+        shapes = [state_shapes for state_shapes in (load_map_shapes(state, level) for state in states) if state_shapes is not None]
+        coords = sum(int(state_shapes.part_coords[state_shapes.align(zip_codes)[0]].sum()) for state_shapes in shapes)
+
+        if coords <= max_coords or level >= COARSEST_LEVEL:
+            return MapLayerFrame(shapes, zip_codes, level)
+
+        level += 1
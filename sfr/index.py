@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from sfr.data import load_data, on_reload
+
+UNRECOGNIZED_METRO = 'Unrecognized Metroplex'
+LEVELS = ['State', 'Metro', 'County', 'City']
+
+
+class FilterNode:
+    __slots__ = ('rows', 'options', 'children')
+
+    def __init__(self):
+        self.rows = None
+        self.options = []
+        self.children = {}
+
+
+class FilterIndex:
+    # State -> Metro -> County -> City tree; every node keeps its sorted child options and its row positions in ZIP order.
+    # Row positions are only valid for the dataset the index was built from, so the index keeps a reference to it.
+    def __init__(self, data):
+        df = data.meta
+        self.data = data
+        self.zips = df.index
+        self.zip_pos = dict(zip(df.index, range(len(df))))
+
+        zip_order = np.argsort(df.index.to_numpy(), kind='stable')
+        self.zip_rank = np.empty(len(df), dtype=np.int64)
+        self.zip_rank[zip_order] = np.arange(len(df))
+
+        self.root = FilterNode()
+        groups = df.groupby(LEVELS, sort=False, dropna=False, observed=True).indices
+
+        for key, rows in groups.items():
+            node = self.root
+            for name in key:
+                node = node.children.setdefault(name, FilterNode())
+            node.rows = rows
+
+        self._finalize(self.root)
+
+        # Whole states and single metroplexes that can be compared alongside the filtered area, by label
+        self.area_keys = {}
+        for state in self.root.options:
+            self.area_keys[f'{state} (Statewide)'] = (state, None)
+            for metro in self.root.children[state].options:
+                self.area_keys[f'{metro} ({state})'] = (state, metro)
+
+    def _sort_rows(self, rows):
+        return rows[np.argsort(self.zip_rank[rows], kind='stable')]
+
+    def _finalize(self, node):
+        if len(node.children) == 0:
+            node.rows = self._sort_rows(node.rows)
+            return
+
+        for child in node.children.values():
+            self._finalize(child)
+
+        node.rows = self._sort_rows(np.concatenate([child.rows for child in node.children.values()]))
+        node.options = sorted(name for name in node.children if pd.notna(name))
+
+        # Make "Unrecognized Metroplex" the last option
+        if UNRECOGNIZED_METRO in node.options:
+            node.options.remove(UNRECOGNIZED_METRO)
+            node.options.append(UNRECOGNIZED_METRO)
+
+    def _county_nodes(self, state, metro, counties=()):
+        metro_node = self.root.children[state].children[metro]
+
+        if len(counties) > 0:
+            return [metro_node.children[county] for county in counties if county in metro_node.children]
+
+        return list(metro_node.children.values())
+
+    def state_opts(self):
+        return self.root.options
+
+    def metro_opts(self, state):
+        return self.root.children[state].options
+
+    def county_opts(self, state, metro):
+        return self.root.children[state].children[metro].options
+
+    def city_opts(self, state, metro, counties=()):
+        county_nodes = self._county_nodes(state, metro, counties)
+
+        if len(county_nodes) == 1:
+            return county_nodes[0].options
+
+        return sorted({city for node in county_nodes for city in node.options})
+
+    def rows(self, state, metro=None, counties=(), cities=()):
+        if metro is None:
+            return self.root.children[state].rows
+
+        if len(counties) == 0 and len(cities) == 0:
+            return self.root.children[state].children[metro].rows
+
+        county_nodes = self._county_nodes(state, metro, counties)
+
+        if len(cities) > 0:
+            row_sets = [node.children[city].rows for node in county_nodes for city in cities if city in node.children]
+        else:
+            row_sets = [node.rows for node in county_nodes]
+
+        if len(row_sets) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        if len(row_sets) == 1:
+            return row_sets[0]
+
+        return self._sort_rows(np.concatenate(row_sets))
+
+    def area_opts(self):
+        return list(self.area_keys)
+
+    def area_rows(self, rows, areas=()):
+        # Rows of the compared areas merged into rows, each looked up in the tree; ZIPs in several areas appear once
+        if len(areas) == 0:
+            return rows
+
+        row_sets = [rows] + [self.rows(*self.area_keys[area]) for area in areas if area in self.area_keys]
+        return self._sort_rows(np.unique(np.concatenate(row_sets)))
+
+    def zip_opts(self, state, metro=None, counties=(), cities=()):
+        return self.zips[self.rows(state, metro, counties, cities)].tolist()
+
+    def zip_rows(self, zip_codes):
+        return np.array([self.zip_pos[zip_code] for zip_code in zip_codes], dtype=np.int64)
+
+
+# Keyed by dataset checksum so a hot-reloaded dataset gets its own index; the previous one is kept for sessions mid-run
+@st.cache_resource(show_spinner='Indexing Avg SFR Value Data...', max_entries=2)
+def index_dataset(checksum, _data):
+    return FilterIndex(_data)
+
+
+@on_reload
+def warm_filter_index(data):
+    index_dataset(data.checksum, data)
+
+
+def load_filter_index():
+    data = load_data()
+    return index_dataset(data.checksum, data)
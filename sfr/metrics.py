@@ -0,0 +1,117 @@
+import json
+import os
+import numpy as np
+import pyarrow as pa
+
+# Growth windows in months, named like the Historic Values timeframes; None measures from each ZIP's first reported month
+GROWTH_WINDOWS = [('YoY', 12), ('3yrs', 36), ('5yrs', 60), ('10yrs', 120), ('Max (Since 2000)', None)]
+
+# Appreciation for every window, plus the annualized rate (CAGR) for the multi-year ones
+METRIC_NAMES = [f'{label} Growth' for label, _ in GROWTH_WINDOWS] + [f'{label} CAGR' for label, months in GROWTH_WINDOWS if months != 12]
+
+# Bumped whenever a metric's definition changes, so sidecars computed the old way are not trusted
+METRICS_REVISION = 2
+
+# Metric cube layers computed per group of ZIP rows, so building the sidecar never needs the whole matrix at once
+CUBE_CHUNK_ROWS = 2000
+
+
+class MetricCube:
+    # Metric x ZIP x month growth rates (fractions), rows aligned with the dataset they were computed from
+    def __init__(self, values, names=METRIC_NAMES):
+        self.values = values
+        self.names = names
+        self.metric_pos = {name: pos for pos, name in enumerate(names)}
+
+    def layer(self, name):
+        return self.values[self.metric_pos[name]]
+
+
+def compute_metrics(values):
+    # All metrics for a ZIP x month block in one pass of array arithmetic; months without a full window stay NaN
+    n_months = values.shape[1]
+    cube = np.full((len(METRIC_NAMES), *values.shape), np.nan, dtype=np.float32)
+    growth = {}
+
+    # Max growth runs from each ZIP's first reported month, and its CAGR counts years from there; ZIPs that never
+    # report get n_months, so every month is before their start
+    reported = ~np.isnan(values)
+    first = np.where(reported.any(axis=1), np.argmax(reported, axis=1), n_months)
+    since_first = np.arange(n_months) - first[:, None]
+    first_vals = values[np.arange(len(values)), np.minimum(first, n_months - 1)][:, None]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for label, months in GROWTH_WINDOWS:
+            layer = cube[METRIC_NAMES.index(f'{label} Growth')]
+
+            if months is None:
+                layer[:] = np.where(since_first > 0, values / first_vals - 1, np.nan)
+            elif months < n_months:
+                layer[:, months:] = values[:, months:] / values[:, :-months] - 1
+
+            growth[label] = layer
+
+        for label, months in GROWTH_WINDOWS:
+            if months == 12:
+                continue
+
+            layer = cube[METRIC_NAMES.index(f'{label} CAGR')]
+            years = (since_first if months is None else np.full((1, n_months), months)) / 12
+            layer[:] = np.power(growth[label] + 1, np.divide(1, years, out=np.full(years.shape, np.nan), where=years > 0)) - 1
+
+    return cube
+
+
+def metrics_info_file(cube_file):
+    return cube_file.with_suffix('.json')
+
+
+def write_metric_cube(data_file, cube_file, checksum, chunk_rows=CUBE_CHUNK_ROWS):
+    # Sidecar for the artifact at data_file, stamped with its checksum and written beside it, then swapped in
+    reader = pa.ipc.open_file(pa.memory_map(str(data_file)))
+    dates = [field.name for field in reader.schema if pa.types.is_floating(field.type)]
+    n_rows = reader.count_rows()
+
+    temp_file = cube_file.with_name(cube_file.name + '.tmp')
+    cube = np.lib.format.open_memmap(temp_file, 'w+', np.float32, (len(METRIC_NAMES), n_rows, len(dates)))
+    start = 0
+
+    for pos in range(reader.num_record_batches):
+        batch = reader.get_batch(pos)
+
+        for offset in range(0, batch.num_rows, chunk_rows):
+            block = batch.slice(offset, chunk_rows)
+            values = np.column_stack([block.column(date).to_numpy(zero_copy_only=False) for date in dates])
+            cube[:, start:start + len(values)] = compute_metrics(values)
+            start += len(values)
+
+    cube.flush()
+    cube = None
+    os.replace(temp_file, cube_file)
+
+    info_file = metrics_info_file(cube_file)
+    info_temp = info_file.with_name(info_file.name + '.tmp')
+    with open(info_temp, 'w') as file:
+        json.dump({'sha256': checksum, 'revision': METRICS_REVISION, 'metrics': METRIC_NAMES}, file, indent=2)
+
+    os.replace(info_temp, info_file)
+
+
+def read_metric_cube(cube_file, checksum, shape):
+    # Memory-mapped, so only the layers and rows a page reads are paged in; None when missing, built for another
+    # artifact or metric revision, or not shaped like its (ZIPs, months) matrix
+    try:
+        with open(metrics_info_file(cube_file)) as file:
+            info = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if checksum is None or info['sha256'] != checksum or info.get('revision') != METRICS_REVISION or info['metrics'] != METRIC_NAMES:
+        return None
+
+    cube = np.load(cube_file, mmap_mode='r')
+
+    if cube.shape != (len(METRIC_NAMES), *shape):
+        return None
+
+    return MetricCube(cube, info['metrics'])
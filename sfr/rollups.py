@@ -0,0 +1,155 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Region levels and the columns that identify one region; county and city names only repeat across states
+ROLLUP_LEVELS = {'Metro': ['State', 'Metro'], 'County': ['State', 'County'], 'City': ['State', 'City']}
+ROLLUP_STATS = ['Median', 'Mean', 'ZIPs']
+
+# Months read from the artifact per pass while building the cube
+ROLLUP_CHUNK_MONTHS = 24
+
+# Bumped whenever the sidecar contents change meaning, so sidecars written the old way are not trusted
+ROLLUPS_REVISION = 2
+
+
+class RegionRollup:
+    # Stat x region x month aggregates of one level, plus the region of every ZIP row of the dataset they came from
+    def __init__(self, regions, row_regions, stats):
+        self.regions = regions
+        self.row_regions = row_regions
+        self.stats = stats
+        self.region_pos = {key: pos for pos, key in enumerate(zip(*[regions[col] for col in regions.columns]))}
+
+    def stat(self, name):
+        return self.stats[ROLLUP_STATS.index(name)]
+
+    def state_regions(self, states):
+        # Positions and names of the states' regions, sorted by name; names carry their state when there are several
+        regions = self.regions[self.regions['State'].isin(states)]
+        regions = regions.sort_values([regions.columns[-1], 'State'])
+        names = regions.iloc[:, -1].astype(str)
+
+        if len(states) > 1:
+            names = names + ' (' + regions['State'].astype(str) + ')'
+
+        return regions.index.to_numpy(), names.tolist()
+
+
+def region_ids(meta, level):
+    # Region of every ZIP row (-1 when a name is missing) and the regions' identifying columns, in order of first appearance
+    keys = meta[ROLLUP_LEVELS[level]].astype(object)
+    # ngroup leaves rows with a missing key as NaN
+    codes = keys.groupby(ROLLUP_LEVELS[level], sort=False).ngroup().fillna(-1)
+    regions = keys[codes >= 0].drop_duplicates().reset_index(drop=True)
+    return codes.to_numpy().astype(np.int32), regions
+
+
+def region_stats(values, row_regions, n_regions):
+    # Median, mean and reporting-ZIP count of every region for every month, from one sort per month column
+    order = np.argsort(row_regions, kind='stable')
+    order = order[row_regions[order] >= 0]
+    sorted_regions = row_regions[order]
+    starts = np.searchsorted(sorted_regions, np.arange(n_regions))
+
+    stats = np.full((len(ROLLUP_STATS), n_regions, values.shape[1]), np.nan, dtype=np.float32)
+
+    for month in range(values.shape[1]):
+        col = values[order, month]
+
+        # NaNs sort after every value of their region
+        month_order = np.lexsort((col, sorted_regions))
+        col = col[month_order]
+
+        valid = ~np.isnan(col)
+        counts = np.bincount(sorted_regions, weights=valid, minlength=n_regions)
+        sums = np.bincount(sorted_regions, weights=np.where(valid, col, 0), minlength=n_regions)
+
+        reported = counts > 0
+        last = np.maximum(counts.astype(np.int64) - 1, 0)
+        lo_mid = col[starts + last // 2]
+        hi_mid = col[starts + np.minimum(counts.astype(np.int64) // 2, last)]
+
+        stats[0, reported, month] = ((lo_mid + hi_mid) / 2)[reported]
+        stats[1, reported, month] = sums[reported] / counts[reported]
+        stats[2, :, month] = counts
+
+    return stats
+
+
+def compute_rollups(meta, values):
+    rollups = {}
+
+    for level in ROLLUP_LEVELS:
+        row_regions, regions = region_ids(meta, level)
+        rollups[level] = RegionRollup(regions, row_regions, region_stats(values, row_regions, len(regions)))
+
+    return rollups
+
+
+def rollups_info_file(rollup_dir):
+    return rollup_dir / 'rollups.json'
+
+
+def write_rollups(data_file, rollup_dir, checksum, chunk_months=ROLLUP_CHUNK_MONTHS):
+    # Region cubes for the artifact at data_file, read a few month columns at a time and stamped with its checksum
+    rollup_dir.mkdir(exist_ok=True)
+    meta = feather.read_table(data_file, columns=list(dict.fromkeys(col for cols in ROLLUP_LEVELS.values() for col in cols))).to_pandas()
+    dates = [field.name for field in pa.ipc.open_file(pa.memory_map(str(data_file))).schema if pa.types.is_floating(field.type)]
+    levels = {level: region_ids(meta, level) for level in ROLLUP_LEVELS}
+    stats = {}
+
+    for level, (row_regions, regions) in levels.items():
+        temp_file = rollup_dir / f'{level.lower()}_stats.npy.tmp'
+        stats[level] = np.lib.format.open_memmap(temp_file, 'w+', np.float32, (len(ROLLUP_STATS), len(regions), len(dates)))
+
+    for start in range(0, len(dates), chunk_months):
+        chunk = dates[start:start + chunk_months]
+        table = feather.read_table(data_file, columns=chunk)
+        values = np.column_stack([table.column(date).to_numpy() for date in chunk]).astype(np.float64)
+
+        for level, (row_regions, regions) in levels.items():
+            stats[level][:, :, start:start + len(chunk)] = region_stats(values, row_regions, len(regions))
+
+    for level, (row_regions, regions) in levels.items():
+        stats[level].flush()
+        stats[level] = None
+        os.replace(rollup_dir / f'{level.lower()}_stats.npy.tmp', rollup_dir / f'{level.lower()}_stats.npy')
+        np.save(rollup_dir / f'{level.lower()}_rows.npy', row_regions)
+        regions.to_feather(rollup_dir / f'{level.lower()}_regions.feather')
+
+    info_temp = rollup_dir / 'rollups.json.tmp'
+    with open(info_temp, 'w') as file:
+        json.dump({'sha256': checksum, 'revision': ROLLUPS_REVISION, 'levels': list(ROLLUP_LEVELS), 'stats': ROLLUP_STATS}, file, indent=2)
+
+    os.replace(info_temp, rollups_info_file(rollup_dir))
+
+
+def read_rollups(rollup_dir, checksum, shape):
+    # Region stats are memory-mapped; None when missing, built for another artifact or sidecar revision, or not shaped
+    # like its (ZIPs, months) matrix
+    try:
+        with open(rollups_info_file(rollup_dir)) as file:
+            info = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if checksum is None or info['sha256'] != checksum or info.get('revision') != ROLLUPS_REVISION or info['levels'] != list(ROLLUP_LEVELS) or info['stats'] != ROLLUP_STATS:
+        return None
+
+    rollups = {}
+
+    for level in ROLLUP_LEVELS:
+        regions = pd.read_feather(rollup_dir / f'{level.lower()}_regions.feather')
+        row_regions = np.load(rollup_dir / f'{level.lower()}_rows.npy')
+        stats = np.load(rollup_dir / f'{level.lower()}_stats.npy', mmap_mode='r')
+
+        if len(row_regions) != shape[0] or stats.shape != (len(ROLLUP_STATS), len(regions), shape[1]):
+            return None
+
+        rollups[level] = RegionRollup(regions, row_regions, stats)
+
+    return rollups
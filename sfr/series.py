@@ -0,0 +1,93 @@
+import numpy as np
+
+# Most points per line the chart draws for a long timeframe in Auto resolution
+POINT_BUDGET = 120
+
+# Selections with more ZIPs than this are charted as percentile bands and a mean instead of one line per ZIP
+AGGREGATE_ZIP_COUNT = 50
+
+BAND_PERCENTILES = [10, 50, 90]
+BAND_NAMES = ['10th Percentile', 'Median', '90th Percentile', 'Mean']
+
+
+def row_means(values):
+    # Mean of each row over its reported values; rows with none are NaN
+    counts = (~np.isnan(values)).sum(axis=1)
+    sums = np.nansum(values, axis=1)
+    return np.divide(sums, counts, out=np.full(len(values), np.nan), where=counts > 0)
+
+
+def shape_signal(values):
+    # One value per month summarizing the selection: every ZIP scaled to its own mean, so each one shapes it equally
+    col_means = row_means(values.T)
+    scale = np.divide(1, col_means, out=np.full(len(col_means), np.nan), where=col_means > 0)
+    return row_means(values * scale)
+
+
+def lttb_positions(y, n_out):
+    # Largest-Triangle-Three-Buckets: keeps the first and last points and, from each bucket between them, the point
+    # forming the largest triangle with the last kept point and the mean of the next bucket
+    n = len(y)
+
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+
+    for bucket in range(n_out - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        next_lo, next_hi = (edges[bucket + 1], edges[bucket + 2]) if bucket + 2 < len(edges) else (n - 1, n)
+
+        prev = keep[bucket]
+        next_x = (next_lo + next_hi - 1) / 2
+        next_y = np.nanmean(y[next_lo:next_hi]) if not np.isnan(y[next_lo:next_hi]).all() else y[prev]
+
+        xs = np.arange(lo, hi)
+        area = np.abs((prev - next_x) * (y[xs] - y[prev]) - (prev - xs) * (next_y - y[prev]))
+        keep[bucket + 1] = lo + np.argmax(np.nan_to_num(area, nan=-1))
+
+    return keep
+
+
+def downsample_positions(values, n_out=POINT_BUDGET):
+    # Month positions shared by every line, so the chart keeps one row per month it shows
+    return lttb_positions(shape_signal(values), n_out)
+
+
+def aggregate_periods(values, dates, months):
+    # Mean value per calendar quarter (3) or year (12), labelled with the period's last month
+    date_parts = np.array([(int(date[:4]), int(date[5:7])) for date in dates])
+    periods = (date_parts[:, 0] * 12 + date_parts[:, 1] - 1) // months
+    starts = np.flatnonzero(np.diff(periods, prepend=periods[0] - 1))
+    ends = np.append(starts[1:], len(dates)) - 1
+
+    sums = np.add.reduceat(np.nan_to_num(values), starts, axis=0)
+    counts = np.add.reduceat(~np.isnan(values), starts, axis=0)
+    means = np.divide(sums, counts, out=np.full(sums.shape, np.nan, dtype=sums.dtype), where=counts > 0)
+
+    return means, [dates[end] for end in ends]
+
+
+def band_values(values):
+    # p10, p50 and p90 (linearly interpolated, like np.nanpercentile) and the mean across ZIPs for every month,
+    # from one sort along the ZIP axis; months no ZIP reports stay NaN
+    ordered = np.sort(values, axis=1)
+    counts = (~np.isnan(values)).sum(axis=1)
+    last = np.maximum(counts - 1, 0)
+    months = np.arange(len(values))
+
+    bands = np.empty((len(values), len(BAND_PERCENTILES) + 1))
+
+    for col, percentile in enumerate(BAND_PERCENTILES):
+        pos = last * percentile / 100
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, last)
+        lo_vals = ordered[months, lo]
+        bands[:, col] = lo_vals + (ordered[months, hi] - lo_vals) * (pos - lo)
+
+    bands[:, -1] = row_means(values)
+    bands[counts == 0] = np.nan
+
+    return bands
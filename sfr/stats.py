@@ -0,0 +1,91 @@
+import numpy as np
+import streamlit as st
+
+# Percentiles of the selection mapped to the ends of the color scale; values beyond them are clipped
+COLOR_QUANTILES = (5, 95)
+
+
+def highlight_positions(values):
+    # Lowest, median-nearest and highest positions of one value column from a single partition; NaNs are skipped
+    valid = np.flatnonzero(~np.isnan(values))
+
+    if len(valid) == 0:
+        return None
+
+    valid_vals = values[valid]
+    count = len(valid_vals)
+    lo_mid, hi_mid = (count - 1) // 2, count // 2
+    order = np.argpartition(valid_vals, sorted({0, lo_mid, hi_mid, count - 1}))
+    lo_val, lo_mid_val, hi_mid_val, hi_val = valid_vals[order[[0, lo_mid, hi_mid, count - 1]]]
+
+    # Ties go to the earliest ZIP, as argmin would pick; both middle values sit equally far from an even-count median
+    lo = np.argmax(valid_vals == lo_val)
+    med = np.argmax((valid_vals == lo_mid_val) | (valid_vals == hi_mid_val))
+    hi = np.argmax(valid_vals == hi_val)
+
+    return valid[[lo, med, hi]]
+
+
+def quantile_scale(values, quantiles=COLOR_QUANTILES):
+    # Linear 0-1 position of each value between the selection's low and high percentiles, so a few outliers
+    # cannot wash out the colors of everything else; NaNs stay NaN
+    valid = values[~np.isnan(values)]
+    scaled = np.full(len(values), np.nan)
+
+    if len(valid) == 0:
+        return scaled
+
+    lo, hi = np.percentile(valid, quantiles)
+
+    if hi > lo:
+        scaled[:] = np.clip((values - lo) / (hi - lo), 0, 1)
+    else:
+        scaled[:] = np.where(np.isnan(values), np.nan, .5)
+
+    return scaled
+
+
+class OrderStats:
+    # Lowest, median-nearest and highest positions for every date of one group of rows, from one sort along the ZIP axis
+    def __init__(self, values):
+        order = np.argsort(values, axis=0, kind='stable')
+        sorted_vals = np.take_along_axis(values, order, axis=0)
+        counts = (~np.isnan(values)).sum(axis=0)
+        last = np.maximum(counts - 1, 0)
+        date_cols = np.arange(values.shape[1])
+
+        # A stable sort lists tied rows earliest first, so the first sorted position holding a value is the earliest
+        # ZIP with it, as argmin would pick
+        def earliest(sort_pos):
+            return order[np.argmax(sorted_vals == sorted_vals[sort_pos, date_cols], axis=0), date_cols]
+
+        lo_mid = earliest(last // 2)
+        hi_mid = earliest(np.minimum(counts // 2, last))
+
+        self.counts = counts
+        self.positions = np.stack([order[0], np.minimum(lo_mid, hi_mid), earliest(last)])
+
+        # The full sort doubles as every date's table order
+        self.order = order.astype(np.int32)
+
+    def get(self, date_pos):
+        if self.counts[date_pos] == 0:
+            return None
+
+        return self.positions[:, date_pos]
+
+    def descending(self, date_pos):
+        # Highest value first and ZIPs without one last, as tables list them
+        count = self.counts[date_pos]
+        order = self.order[:, date_pos]
+        return np.concatenate([order[:count][::-1], order[count:]])
+
+
+@st.cache_resource(max_entries=64)
+def metro_order_stats(checksum, state, metro, _index):
+    # Positions are relative to the metro's rows in ZIP order, the same rows an unfiltered metro selection holds
+    return OrderStats(_index.data.values[_index.rows(state, metro)])
+
+
+def load_metro_order_stats(index, state, metro):
+    return metro_order_stats(index.data.checksum, state, metro, index)
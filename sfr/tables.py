@@ -0,0 +1,37 @@
+import numpy as np
+import streamlit as st
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+# Months of history the Historic Values table opens with
+DEFAULT_TABLE_MONTHS = 12
+
+
+def descending_order(values):
+    # Row positions from highest to lowest value, ZIPs without one last; stable, so ties keep ZIP order
+    return np.argsort(-values, kind='stable')
+
+
+def table_pager(key, n_rows):
+    # Rows-per-page and page widgets; only the returned slice of the sorted rows is sent to the browser
+    size_col, page_col, info_col = st.columns([.2, .2, .6])
+
+    with size_col:
+        page_size = st.selectbox('Rows per Page', PAGE_SIZES, key=f'{key}_page_size')
+
+    n_pages = max(1, -(-n_rows // page_size))
+
+    # A larger page size or a smaller selection can leave the remembered page past the end
+    if st.session_state.get(f'{key}_page', 1) > n_pages:
+        st.session_state[f'{key}_page'] = n_pages
+
+    with page_col:
+        page = st.number_input(f'Page (of {n_pages:,})', 1, n_pages, key=f'{key}_page')
+
+    start = (page - 1) * page_size
+    stop = min(start + page_size, n_rows)
+
+    with info_col:
+        st.caption(f'ZIPs {min(start + 1, n_rows):,} to {stop:,} of {n_rows:,}')
+
+    return slice(start, stop)
@@ -0,0 +1,220 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import streamlit as st
+from os import listdir
+from threading import Lock
+from sfr.cache import LRUCache
+from sfr.rollups import ROLLUP_CHUNK_MONTHS, ROLLUP_STATS, region_stats
+
+# Web Mercator tile zooms written by the tiling stage; every tile is split into a square grid of cells
+TILE_ZOOMS = [3, 5, 7]
+CELLS_PER_TILE = 32
+
+# Named views of the national map: (map zoom, tile zoom whose cells are a few pixels across at that map zoom)
+TILE_VIEWS = {'Nation': (3.5, 3), 'Region': (5.5, 5), 'Metro': (7.5, 7)}
+
+# Map size assumed when working out which tiles are in view, in pixels
+VIEW_WIDTH = 1000
+VIEW_HEIGHT = 500
+
+TILE_CACHE_BYTES = 128 * 2**20
+
+
+def tile_coords(lat, lon, zoom):
+    # Fractional Web Mercator tile coordinates of points at a zoom
+    scale = 2**zoom
+    x = (np.asarray(lon) + 180) / 360 * scale
+    y = (1 - np.arcsinh(np.tan(np.radians(np.asarray(lat)))) / np.pi) / 2 * scale
+    return x, y
+
+
+def tile_lonlat(x, y, zoom):
+    # Inverse of tile_coords
+    scale = 2**zoom
+    lon = np.asarray(x) / scale * 360 - 180
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(y) / scale))))
+    return lat, lon
+
+
+def read_centroids(geometry_dir):
+    # ZIP centroids from the attribute columns of the state geometry files, so geopandas is never needed
+    frames = []
+
+    for file in sorted(listdir(geometry_dir)):
+        if file.endswith('.feather'):
+            table = feather.read_table(geometry_dir / file, columns=['ZCTA5CE10', 'INTPTLAT10', 'INTPTLON10'])
+            frames.append(table.to_pandas())
+
+    centroids = pd.concat(frames).drop_duplicates('ZCTA5CE10').set_index('ZCTA5CE10')
+    return centroids.astype(float).rename(columns={'INTPTLAT10': 'Latitude', 'INTPTLON10': 'Longitude'})
+
+
+def cell_ids(x, y):
+    # Grid cell of every point at one zoom (-1 when it has no centroid), and the cells' global column and row
+    valid = ~np.isnan(x)
+    cells = np.stack([np.floor(x[valid] * CELLS_PER_TILE), np.floor(y[valid] * CELLS_PER_TILE)], axis=1).astype(np.int64)
+    grid, inverse = np.unique(cells, axis=0, return_inverse=True)
+
+    row_cells = np.full(len(x), -1, dtype=np.int32)
+    row_cells[valid] = inverse.ravel()
+    return row_cells, grid
+
+
+def tile_info_file(tile_dir):
+    return tile_dir / 'tiles.json'
+
+
+def write_tiles(data_file, tile_dir, checksum, geometry_dir, chunk_months=ROLLUP_CHUNK_MONTHS):
+    # Median, mean and ZIP count of every grid cell for every month at each tile zoom, one file per tile with ZIPs,
+    # stamped with the artifact's checksum; ZIPs without geometry have no centroid and are left out
+    meta = feather.read_table(data_file, columns=['ZIP', 'State']).to_pandas()
+
+    # ZIPs are stored as fixed-width integer codes
+    centroids = read_centroids(geometry_dir).reindex(np.char.zfill(meta['ZIP'].to_numpy().astype(str), 5))
+    dates = [field.name for field in pa.ipc.open_file(pa.memory_map(str(data_file))).schema if pa.types.is_floating(field.type)]
+
+    lat, lon = centroids['Latitude'].to_numpy(), centroids['Longitude'].to_numpy()
+    levels = {}
+
+    for zoom in TILE_ZOOMS:
+        row_cells, grid = cell_ids(*tile_coords(lat, lon, zoom))
+        levels[zoom] = (row_cells, grid, np.empty((len(ROLLUP_STATS), len(grid), len(dates)), dtype=np.float32))
+
+    for start in range(0, len(dates), chunk_months):
+        chunk = dates[start:start + chunk_months]
+        table = feather.read_table(data_file, columns=chunk)
+        values = np.column_stack([table.column(date).to_numpy() for date in chunk]).astype(np.float64)
+
+        for row_cells, grid, stats in levels.values():
+            stats[:, :, start:start + len(chunk)] = region_stats(values, row_cells, len(grid))
+
+    # Tiles are read lazily by servers holding this build, so they are only ever written into a new directory
+    info_file = tile_info_file(tile_dir)
+    tile_dir.mkdir()
+    tiles = {}
+
+    for zoom, (row_cells, grid, stats) in levels.items():
+        zoom_dir = tile_dir / f'z{zoom}'
+        zoom_dir.mkdir()
+
+        tile_keys = grid // CELLS_PER_TILE
+        local_cells = (grid % CELLS_PER_TILE).astype(np.int16)
+        tile_ids, tile_cells = np.unique(tile_keys, axis=0, return_inverse=True)
+        tile_cells = tile_cells.ravel()
+
+        for tile_pos, (x, y) in enumerate(tile_ids):
+            cells = np.flatnonzero(tile_cells == tile_pos)
+            np.savez(zoom_dir / f'{x}_{y}.npz', cells=local_cells[cells], stats=stats[:, cells])
+
+        tiles[str(zoom)] = tile_ids.tolist()
+
+    # Where the national map centers when a state is chosen
+    centers = centroids.assign(State=meta['State'].to_numpy()).dropna().groupby('State', observed=True).median()
+
+    info_temp = info_file.with_name(info_file.name + '.tmp')
+    with open(info_temp, 'w') as file:
+        json.dump({
+            'sha256': checksum,
+            'zooms': TILE_ZOOMS,
+            'cells_per_tile': CELLS_PER_TILE,
+            'stats': ROLLUP_STATS,
+            'months': len(dates),
+            'tiles': tiles,
+            'centers': {state: [row.Latitude, row.Longitude] for state, row in centers.iterrows()},
+        }, file, indent=2)
+
+    os.replace(info_temp, info_file)
+
+
+def tile_bytes(tile):
+    return tile['cells'].nbytes + tile['stats'].nbytes
+
+
+class TileSet:
+    # Which tiles exist, read once from tiles.json, plus a byte-capped LRU of the tiles loaded so far. The tiles of a
+    # build are never rewritten, but they are deleted once two newer builds are published
+    def __init__(self, tile_dir, info, max_bytes=TILE_CACHE_BYTES):
+        self.tile_dir = tile_dir
+        self.centers = info['centers']
+        self.tiles = {int(zoom): {tuple(tile) for tile in tiles} for zoom, tiles in info['tiles'].items()}
+        self._cache = LRUCache(max_bytes=max_bytes, sizeof=tile_bytes)
+        self._lock = Lock()
+
+    def tiles_in_view(self, lat, lon, map_zoom, zoom):
+        # Tiles of a zoom that overlap a VIEW_WIDTH x VIEW_HEIGHT map centered on (lat, lon), among those with ZIPs
+        x, y = tile_coords(lat, lon, zoom)
+        half_x = VIEW_WIDTH / 2 / 256 * 2**(zoom - map_zoom)
+        half_y = VIEW_HEIGHT / 2 / 256 * 2**(zoom - map_zoom)
+
+        xs = range(int(np.floor(x - half_x)), int(np.floor(x + half_x)) + 1)
+        ys = range(int(np.floor(y - half_y)), int(np.floor(y + half_y)) + 1)
+        return [(tx, ty) for tx in xs for ty in ys if (tx, ty) in self.tiles.get(zoom, ())]
+
+    def get(self, zoom, x, y):
+        with self._lock:
+            tile = self._cache.get((zoom, x, y))
+
+            if tile is None:
+                try:
+                    with np.load(self.tile_dir / f'z{zoom}' / f'{x}_{y}.npz') as file:
+                        tile = {'cells': file['cells'], 'stats': file['stats']}
+                except FileNotFoundError:
+                    return None
+
+                self._cache.put((zoom, x, y), tile)
+
+        return tile
+
+    def cell_frame(self, zoom, tiles, date_pos):
+        # One row per grid cell of the tiles, with its square outline and its stats at date_pos and a year earlier
+        polygons, stats, prior = [], [], []
+
+        for x, y in tiles:
+            tile = self.get(zoom, x, y)
+
+            # Tiles of a pruned build are left out until the session moves to the current one
+            if tile is None:
+                continue
+
+            gx = x * CELLS_PER_TILE + tile['cells'][:, 0]
+            gy = y * CELLS_PER_TILE + tile['cells'][:, 1]
+
+            # Cell corners in lon/lat, going around the square
+            lat0, lon0 = tile_lonlat(gx / CELLS_PER_TILE, gy / CELLS_PER_TILE, zoom)
+            lat1, lon1 = tile_lonlat((gx + 1) / CELLS_PER_TILE, (gy + 1) / CELLS_PER_TILE, zoom)
+            corners = np.stack([lon0, lat0, lon1, lat0, lon1, lat1, lon0, lat1], axis=1).round(5)
+
+            polygons.extend(corners.tolist())
+            stats.append(tile['stats'][:, :, date_pos].T)
+            prior.append(tile['stats'][ROLLUP_STATS.index('Median'), :, date_pos - 12] if date_pos >= 12 else np.full(len(gx), np.nan))
+
+        stats = np.concatenate(stats) if len(stats) > 0 else np.empty((0, len(ROLLUP_STATS)))
+        cell_df = pd.DataFrame(stats, columns=ROLLUP_STATS)
+        cell_df['Prior Median'] = np.concatenate(prior) if len(prior) > 0 else []
+        cell_df.insert(0, 'polygon', polygons)
+
+        return cell_df
+
+
+def read_tile_set(tile_dir, checksum, n_months):
+    # None when the tiles are missing, were built for another artifact or cover a different number of months
+    try:
+        with open(tile_info_file(tile_dir)) as file:
+            info = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if checksum is None or info['sha256'] != checksum or info['zooms'] != TILE_ZOOMS or info['cells_per_tile'] != CELLS_PER_TILE or info['stats'] != ROLLUP_STATS or info['months'] != n_months:
+        return None
+
+    return TileSet(tile_dir, info)
+
+
+# Keyed by dataset checksum, like the filter index, so a hot reload picks up the tiles built with the new artifact
+@st.cache_resource(max_entries=2)
+def load_tile_set(checksum, tile_dir, n_months):
+    return read_tile_set(tile_dir, checksum, n_months)
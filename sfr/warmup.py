@@ -0,0 +1,64 @@
+import threading
+import time
+import streamlit as st
+from sfr.data import load_data
+from sfr.index import load_filter_index
+
+# States whose map shapes are preloaded, besides the default state: the ones with the most ZIPs that have geometry
+WARM_STATE_COUNT = 5
+
+
+class WarmupStatus:
+    # Progress of the warm-up thread, shared by every session so pages can report readiness
+    def __init__(self):
+        self.stage = 'Starting'
+        self.ready = False
+        self.error = None
+        self.started = time.monotonic()
+        self.seconds = None
+
+    def set_stage(self, stage):
+        self.stage = stage
+
+    def finish(self, error=None):
+        self.error = error
+        self.seconds = time.monotonic() - self.started
+        self.stage = 'Ready' if error is None else 'Failed'
+        self.ready = True
+
+
+def warm_up(status):
+    # Fills the same process-wide caches the pages read, so the first visitor hits warm caches like everyone after
+    try:
+        status.set_stage('Loading Avg SFR Value Data')
+        load_data()
+
+        status.set_stage('Indexing Avg SFR Value Data')
+        index = load_filter_index()
+
+        status.set_stage('Loading map libraries')
+        import pydeck
+        from sfr.geometry import load_geometry_store, load_map_shapes, pick_level
+
+        status.set_stage('Loading ZIP geometries')
+        mapped = {state for state, level in load_geometry_store().manifest}
+        states = [state for state in index.state_opts() if state in mapped]
+        busiest = sorted(states, key=lambda state: len(index.rows(state)), reverse=True)[:WARM_STATE_COUNT]
+
+        for state in dict.fromkeys(states[:1] + busiest):
+            # Choosing a state opens the heat map on the first county of its first metroplex, so warm the level
+            # that selection is drawn at
+            metro = index.metro_opts(state)[0]
+            load_map_shapes(state, pick_level(n_zips=len(index.rows(state, metro, index.county_opts(state, metro)[:1]))))
+
+        status.finish()
+    except Exception as error:
+        status.finish(error)
+
+
+@st.cache_resource
+def start_warmup():
+    # Once per server process; python serve.py calls this before the server starts, streamlit run on the first visit
+    status = WarmupStatus()
+    threading.Thread(target=warm_up, args=(status,), daemon=True, name='sfr-warmup').start()
+    return status
@@ -0,0 +1,13 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    # Data, geometry and manifest paths are relative to the repository root, as when the app is served
+    monkeypatch.chdir(REPO_ROOT)
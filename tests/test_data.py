@@ -0,0 +1,63 @@
+import time
+
+import numpy as np
+import pytest
+
+from data_prep import prepare
+from sfr import data as sfr_data
+from sfr.data import DatasetManager
+from test_prepare import source_frame, use_data_dir
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    use_data_dir(monkeypatch, tmp_path / 'data')
+    return tmp_path / 'data'
+
+
+def publish(source, path):
+    source.to_csv(path, index=False)
+    prepare.prepare_full(path)
+
+
+def test_reload_warms_before_swap(tmp_path, data_dir, monkeypatch):
+    source = source_frame()
+    publish(source.drop(columns=source.columns[-1]), tmp_path / 'old.csv')
+    manager = DatasetManager(data_dir / 'manifest.json', check_seconds=0)
+    old = manager._data
+
+    # Without readable sidecars the reload thread has to compute the metrics and rollups itself
+    publish(source, tmp_path / 'new.csv')
+    monkeypatch.setattr(sfr_data, 'sidecar_dir', lambda data_file: tmp_path / 'missing')
+
+    warmed = []
+    monkeypatch.setattr(sfr_data, 'RELOAD_WARMERS', [lambda data: warmed.append((data, manager._data))])
+
+    assert manager.current() is old
+
+    deadline = time.monotonic() + 30
+    while manager._data is old and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    new = manager._data
+    assert new is not old
+    assert warmed == [(new, old)]
+    assert new._metrics is not None and new._rollups is not None
+
+
+def test_filter_index_warmed_on_reload():
+    from sfr.index import warm_filter_index
+
+    assert warm_filter_index in sfr_data.RELOAD_WARMERS
+
+
+def test_value_matrix_sidecar_matches_artifact(tmp_path, data_dir):
+    publish(source_frame(), tmp_path / 'source.csv')
+    path, checksum = sfr_data.manifest_artifact(data_dir / 'manifest.json')
+
+    mapped = sfr_data.read_dataset(path, checksum)
+    copied = sfr_data.read_dataset(path)
+
+    assert isinstance(mapped.values, np.memmap) and not isinstance(copied.values, np.memmap)
+    np.testing.assert_array_equal(mapped.values, copied.values)
+    assert mapped.values.flags.c_contiguous and not mapped.values.flags.writeable
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+import pytest
+
+from data_prep import prepare
+from sfr.data import manifest_artifact, read_dataset
+
+N_ZIPS = 40
+N_MONTHS = 30
+NEW_MONTHS = 4
+
+
+def source_frame(seed=0):
+    # A Zillow-shaped source with fractional values and leading, interior and trailing gaps, on real CT ZIPs so the
+    # tiling stage finds their centroids
+    rng = np.random.default_rng(seed)
+    zips = feather.read_table('geometries/ct_connecticut_zip_codes_geo.feather', columns=['ZCTA5CE10']).column(0).to_pylist()[:N_ZIPS + 5]
+    dates = [str(date.date()) for date in pd.date_range('2000-01-31', periods=N_MONTHS + NEW_MONTHS, freq='ME')]
+
+    values = 100000 + rng.normal(0, 30000, (len(zips), 1)) + np.cumsum(rng.normal(150, 900, (len(zips), len(dates))), axis=1)
+    values[rng.random(values.shape) < 0.15] = np.nan
+    values[:8, N_MONTHS - 6:N_MONTHS] = np.nan
+    values[8:12, :5] = np.nan
+    values[12, N_MONTHS - 4:] = np.nan
+
+    geo = pd.DataFrame({
+        'RegionID': range(len(zips)), 'SizeRank': range(len(zips)), 'RegionName': zips, 'RegionType': 'zip',
+        'StateName': 'CT', 'State': 'CT', 'City': [f'City {pos % 7}' for pos in range(len(zips))],
+        'Metro': [None if pos % 9 == 0 else f'Metro {pos % 3}' for pos in range(len(zips))],
+        'CountyName': [f'County {pos % 4}' for pos in range(len(zips))],
+    })
+    return pd.concat([geo, pd.DataFrame(values, columns=dates)], axis=1)
+
+
+def use_data_dir(monkeypatch, data_dir):
+    data_dir.mkdir()
+    monkeypatch.setattr(prepare, 'DATA_DIR', data_dir)
+    monkeypatch.setattr(prepare, 'MANIFEST_FILE', data_dir / 'manifest.json')
+    monkeypatch.setattr(prepare, 'TEMP_FILE', data_dir / 'zhvi.feather.tmp')
+
+
+def published(data_dir):
+    return read_dataset(manifest_artifact(data_dir / 'manifest.json')[0])
+
+
+@pytest.mark.parametrize('chunk_rows', [7, prepare.CHUNK_ROWS])
+@pytest.mark.parametrize('mode', ['update', 'stream'])
+def test_matches_full_rebuild(tmp_path, monkeypatch, mode, chunk_rows):
+    source = source_frame()
+
+    # Last month's source has fewer months and ZIPs; this month's drops some of those ZIPs, adds others, renames a
+    # metro, moves a ZIP to another city and is reordered, as Zillow re-ranks ZIPs every month
+    old_source = source.iloc[:N_ZIPS].drop(columns=source.columns[-NEW_MONTHS:])
+    new_source = source.drop(index=[3, 20, 33]).sample(frac=1, random_state=1)
+    new_source['Metro'] = new_source['Metro'].replace('Metro 1', 'Metro 1 Renamed')
+    new_source.loc[5, 'City'] = 'City 9'
+
+    old_csv, new_csv = tmp_path / 'old.csv', tmp_path / 'new.csv'
+    old_source.to_csv(old_csv, index=False)
+    new_source.to_csv(new_csv, index=False)
+
+    use_data_dir(monkeypatch, tmp_path / mode)
+
+    if mode == 'update':
+        prepare.prepare_full(old_csv)
+        prepare.prepare_incremental(new_csv, chunk_rows)
+    else:
+        prepare.prepare_streaming(new_csv, chunk_rows)
+
+    built = published(tmp_path / mode)
+
+    use_data_dir(monkeypatch, tmp_path / 'full')
+    prepare.prepare_full(new_csv)
+    rebuilt = published(tmp_path / 'full')
+
+    assert built.dates == rebuilt.dates
+    pd.testing.assert_frame_equal(built.meta.astype(object), rebuilt.meta.astype(object))
+    np.testing.assert_array_equal(built.values, rebuilt.values)
+
+
+def test_interpolate_rows_matches_pandas():
+    values = source_frame().iloc[:, 9:].to_numpy()
+    expected = pd.DataFrame(values).interpolate(axis=1).to_numpy()
+
+    np.testing.assert_array_equal(prepare.interpolate_rows(values.copy()), expected)
+
+
+def test_update_without_changes_keeps_artifact(tmp_path, monkeypatch, capsys):
+    source_csv = tmp_path / 'source.csv'
+    source_frame().to_csv(source_csv, index=False)
+
+    use_data_dir(monkeypatch, tmp_path / 'data')
+    prepare.prepare_full(source_csv)
+    artifact = manifest_artifact(tmp_path / 'data' / 'manifest.json')
+
+    prepare.prepare_incremental(source_csv)
+
+    assert 'already up to date' in capsys.readouterr().out
+    assert manifest_artifact(tmp_path / 'data' / 'manifest.json') == artifact
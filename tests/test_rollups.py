@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from sfr.rollups import ROLLUP_STATS, compute_rollups, read_rollups, region_ids, write_rollups
+
+
+def sample_meta():
+    return pd.DataFrame({
+        'State': pd.Categorical(['CT', 'CT', 'CT', 'RI']),
+        'City': pd.Categorical(['Hartford', None, 'Hartford', 'Newport']),
+        'Metro': pd.Categorical(['Hartford', 'Hartford', 'Hartford', 'Providence']),
+        'County': pd.Categorical(['Hartford County', None, 'Hartford County', 'Newport County']),
+    }, index=pd.Index(['06101', '06102', '06103', '02840'], name='ZIP'))
+
+
+def test_missing_names_have_no_region():
+    meta = sample_meta()
+
+    for level in ['County', 'City']:
+        row_regions, regions = region_ids(meta, level)
+
+        assert row_regions.tolist() == [0, -1, 0, 1]
+        assert len(regions) == 2
+
+
+def test_missing_names_left_out_of_stats():
+    values = np.array([[100, 110], [900, 990], [300, 330], [500, np.nan]], dtype=np.float32)
+    county = compute_rollups(sample_meta(), values)['County']
+
+    np.testing.assert_array_equal(county.stat('Median'), [[200, 220], [500, np.nan]])
+    np.testing.assert_array_equal(county.stat('ZIPs'), [[2, 2], [1, 0]])
+
+    # Every ZIP row maps to a region or to -1, so per-ZIP lookups of region values can be masked on >= 0
+    assert county.row_regions.min() == -1
+
+
+def test_sidecar_round_trip(tmp_path):
+    meta = sample_meta()
+    values = np.array([[100, 110], [900, 990], [300, 330], [500, np.nan]], dtype=np.float32)
+    frame = pd.concat([meta.reset_index(), pd.DataFrame(values, columns=['2000-01-31', '2000-02-29'])], axis=1)
+    data_file = tmp_path / 'zhvi.feather'
+    frame.to_feather(data_file)
+
+    write_rollups(data_file, tmp_path / 'rollups', 'abc')
+    rollups = read_rollups(tmp_path / 'rollups', 'abc', values.shape)
+
+    assert rollups['County'].row_regions.tolist() == [0, -1, 0, 1]
+    np.testing.assert_array_equal(rollups['City'].stats, compute_rollups(meta, values)['City'].stats)
+    assert read_rollups(tmp_path / 'rollups', 'other', values.shape) is None
+    assert rollups['County'].stats.shape == (len(ROLLUP_STATS), 2, 2)
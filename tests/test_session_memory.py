@@ -0,0 +1,50 @@
+import pickle
+
+import pytest
+
+from sfr.data import load_data, manifest_artifact
+
+SESSIONS = 16
+
+
+def rss_mb():
+    with open('/proc/self/status') as file:
+        for line in file:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+
+
+@pytest.fixture
+def shared_data():
+    if not manifest_artifact()[0].exists():
+        pytest.skip('no prepared artifact; run data_prep/prepare.py')
+
+    return load_data()
+
+
+def test_sessions_share_one_dataset(shared_data):
+    sessions = [{'data': load_data()} for _ in range(SESSIONS)]
+
+    assert all(session['data'] is shared_data for session in sessions)
+    assert all(session['data'].values.base is shared_data.values.base for session in sessions)
+
+
+def test_resident_memory_flat_as_sessions_grow(shared_data):
+    # What st.cache_data used to copy into every session: the metadata and the value matrix, not the memory-mapped
+    # metric and region sidecars
+    payload = pickle.dumps((shared_data.meta, shared_data.values))
+    payload_mb = len(payload) / 2**20
+
+    before = rss_mb()
+    sessions = [{'data': load_data()} for _ in range(SESSIONS)]
+    shared_growth = rss_mb() - before
+
+    before = rss_mb()
+    copies = [{'data': pickle.loads(payload)} for _ in range(SESSIONS)]
+    copied_growth = rss_mb() - before
+
+    assert shared_growth < max(1, payload_mb / 4)
+    assert copied_growth > SESSIONS * payload_mb / 2
+
+    sessions = None
+    copies = None
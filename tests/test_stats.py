@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from sfr.stats import OrderStats, highlight_positions
+
+
+def baseline_positions(col):
+    # What the original heat map showed: the first ZIP at the min and max, and argmin of the distance to the median
+    valid = ~np.isnan(col)
+    median = np.median(col[valid])
+    return [np.nanargmin(col), int(np.argmin(np.where(valid, np.abs(col - median), np.inf))), np.nanargmax(col)]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_ties_and_gaps_match_baseline(seed):
+    # Few distinct values and missing months, so most columns have ties at the median and at both ends
+    rng = np.random.default_rng(seed)
+    values = rng.integers(0, 4, (int(rng.integers(1, 15)), 12)).astype(float)
+    values[rng.random(values.shape) < .2] = np.nan
+    stats = OrderStats(values)
+
+    for date_pos in range(values.shape[1]):
+        col = values[:, date_pos]
+
+        if np.isnan(col).all():
+            assert stats.get(date_pos) is None
+            assert highlight_positions(col) is None
+        else:
+            expected = baseline_positions(col)
+            assert list(stats.get(date_pos)) == expected
+            assert list(highlight_positions(col)) == expected
+
+
+def test_even_count_median_takes_earlier_middle_zip():
+    col = np.array([4, 3, 1, 2, 3, 2], dtype=float)
+
+    assert list(highlight_positions(col)) == [2, 1, 0]
+    assert list(OrderStats(col[:, None]).get(0)) == [2, 1, 0]